@@ -0,0 +1,45 @@
+import azure.functions as func
+import logging
+import os
+import json
+from shared_code.cosmos_pool import get_container
+from shared_code.enrichment import backfill_citation_summaries
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    One-off backfill of the citationSummary field on existing tool messages.
+    Processes up to maxItems documents (default 1000) per call; call again
+    until "scanned" is 0. New messages are enriched by QuestionsChangeFeed.
+    """
+    try:
+        logging.info('BackfillCitationSummaries function processed a request.')
+        endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
+        key = os.environ.get('COSMOS_DB_KEY')
+        database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+        container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        if not endpoint or not key:
+            raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+        try:
+            max_items = int(req.params.get('maxItems', '1000'))
+        except ValueError:
+            return func.HttpResponse(
+                json.dumps({"error": "maxItems must be an integer"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        container = get_container(container_name, database_name)
+        result = backfill_citation_summaries(container, max_items=max_items)
+        logging.info(f"BackfillCitationSummaries: {result['enriched']} of {result['scanned']} documents enriched.")
+        return func.HttpResponse(
+            json.dumps(result),
+            status_code=200,
+            mimetype="application/json"
+        )
+    except Exception as e:
+        logging.error(f"BackfillCitationSummaries error: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
@@ -0,0 +1,57 @@
+import azure.functions as func
+import logging
+import os
+import json
+from shared_code.cosmos_pool import get_container, get_history_container
+from shared_code.enrichment import backfill_title_index
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    One-off backfill of the titleLower field used by ConversationView and
+    ConversationViewTitle. source=questions (default) covers the configured
+    container, source=history the conversation history. Processes up to
+    maxItems documents (default 1000) per call; call again until "scanned"
+    is 0. New conversations are enriched by the change feed functions.
+    """
+    try:
+        logging.info('BackfillTitleIndex function processed a request.')
+        endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
+        key = os.environ.get('COSMOS_DB_KEY')
+        database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+        container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        if not endpoint or not key:
+            raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+        source = req.params.get('source', 'questions')
+        if source not in ('questions', 'history'):
+            return func.HttpResponse(
+                json.dumps({"error": "source must be 'questions' or 'history'"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        try:
+            max_items = int(req.params.get('maxItems', '1000'))
+        except ValueError:
+            return func.HttpResponse(
+                json.dumps({"error": "maxItems must be an integer"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        if source == 'history':
+            container = get_history_container()
+        else:
+            container = get_container(container_name, database_name)
+        result = backfill_title_index(container, max_items=max_items)
+        logging.info(f"BackfillTitleIndex ({source}): {result['enriched']} of {result['scanned']} documents enriched.")
+        return func.HttpResponse(
+            json.dumps(result),
+            status_code=200,
+            mimetype="application/json"
+        )
+    except Exception as e:
+        logging.error(f"BackfillTitleIndex error: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
@@ -0,0 +1,57 @@
+import datetime
+import logging
+import os
+import azure.functions as func
+from shared_code.cosmos_pool import get_container, get_database, get_history_container
+from shared_code.rollups import (build_daily_rollup, get_rollup_container, read_daily_rollup, stale_rollup_days,
+                                 write_daily_rollup)
+from shared_code.theme_taxonomy import refresh_theme_taxonomy
+
+def main(mytimer: func.TimerRequest) -> None:
+    """
+    Nightly rebuild of the daily rollup documents read by GetAnalytics.
+    Rebuilds the last ROLLUP_REBUILD_DAYS completed days (default 2) so that
+    documents written or updated after midnight are picked up; a day is
+    skipped when its rollup is current (built with the current theme
+    taxonomy, and after the last change the change feed marked on it).
+    Older days the change feed marked as changed since their rollup was
+    built (late clicks, edited conversations) are rebuilt too, at most
+    ROLLUP_REBUILD_MAX_DAYS (default 31) per run, most recent first.
+    """
+    utc_timestamp = datetime.datetime.utcnow().replace(
+        tzinfo=datetime.timezone.utc).isoformat()
+    logging.info('BuildDailyRollups function ran at %s', utc_timestamp)
+    try:
+        endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
+        key = os.environ.get('COSMOS_DB_KEY')
+        database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+        container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        force_id = os.environ.get('FORCE_IDENTIFIER', 'unknown')
+        rebuild_days = int(os.environ.get('ROLLUP_REBUILD_DAYS', '2'))
+        max_stale_days = int(os.environ.get('ROLLUP_REBUILD_MAX_DAYS', '31'))
+        if not endpoint or not key:
+            raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+
+        db = get_database(database_name)
+        container = get_container(container_name, database_name)
+        container2 = get_history_container()
+        rollup_container = get_rollup_container(db)
+        # Rollups built with an older taxonomy are not "current" and get rebuilt
+        refresh_theme_taxonomy(rollup_container, force_id)
+
+        today = datetime.datetime.utcnow().date()
+        recent = [today - datetime.timedelta(days=offset) for offset in range(1, rebuild_days + 1)]
+        stale = stale_rollup_days(rollup_container, force_id, recent[-1] if recent else today)
+        if len(stale) > max_stale_days:
+            logging.warning(f"{len(stale)} older rollups are stale; rebuilding the {max_stale_days} most recent.")
+        for day in recent + stale[:max_stale_days]:
+            existing = read_daily_rollup(rollup_container, force_id, day)
+            if existing and existing.get('lastChangeAt'):
+                logging.info(f"Rollup for {force_id} {day} is current, skipping.")
+                continue
+            doc = build_daily_rollup(container, container2, force_id, day)
+            write_daily_rollup(rollup_container, doc)
+            logging.info(f"Rollup written for {force_id} {day}: {doc['documentCount']} documents.")
+    except Exception as e:
+        logging.error(f"BuildDailyRollups error: {str(e)}")
+        raise
@@ -1,28 +1,21 @@
 import azure.functions as func
 import os
 import json
-from azure.cosmos import CosmosClient
+from shared_code import partition_routing as routing
+from shared_code.cosmos_pool import get_container
+from shared_code.title_index import find_conversation_by_title
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     title = req.params.get('title')
     if not title:
         return func.HttpResponse("<html><body><h2>Error: No conversation title provided.</h2><p>Please specify a conversation title in the URL, e.g. <code>?title=YourTitle</code>.</p></body></html>", status_code=400, mimetype='text/html')
-    endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
-    key = os.environ.get('COSMOS_DB_KEY')
     database_name = os.environ.get('COSMOS_DB_DATABASE', 'db_conversation_history')
     container_name = os.environ.get('COSMOS_DB_CONTAINER', 'Conversations')
-    client = CosmosClient(endpoint, key)
-    db = client.get_database_client(database_name)
-    container = db.get_container_client(container_name)
-    query = "SELECT * FROM c WHERE LOWER(c.title) = @title"
-    items = list(container.query_items(
-        query=query,
-        parameters=[{"name": "@title", "value": title.lower()}],
-        enable_cross_partition_query=True
-    ))
-    if not items:
+    container = get_container(container_name, database_name)
+    # Find the conversation by title (case-insensitive, via titleLower)
+    conv = find_conversation_by_title(container, title)
+    if conv is None:
         return func.HttpResponse("<html><body><h2>Conversation not found</h2><p>No conversation found with title: <b>" + title + "</b></p></body></html>", status_code=404, mimetype='text/html')
-    conv = items[0]
     html = "<html><head><title>" + (conv.get('title') or '') + "</title>" + \
         "<style>body { font-family: 'Segoe UI', Arial, sans-serif; background: #f8fafc; color: #232946; margin: 0; padding: 32px; }" + \
         ".container { max-width: 700px; margin: 0 auto; background: #fff; border-radius: 14px; box-shadow: 0 4px 24px #1e3a8a22; padding: 32px; }" + \
@@ -68,11 +61,13 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     conversation_id = conv.get('id')
     try:
         messages_query = "SELECT * FROM c WHERE c.conversationId = @cid ORDER BY c.createdAt ASC"
-        messages = list(container.query_items(
-            query=messages_query,
-            parameters=[{"name": "@cid", "value": conversation_id}],
-            enable_cross_partition_query=True
-        ))
+        # Single-partition when the messages share the conversation's partition key
+        messages = routing.query(
+            container,
+            messages_query,
+            [{"name": "@cid", "value": conversation_id}],
+            routing.conversation_partition(container, conversation_id, conversation=conv)
+        )
         i = 0
         while i < len(messages):
             msg = messages[i]
@@ -1,5 +1,6 @@
 import azure.functions as func
 import logging
+from shared_code.compression import compressed_response
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
@@ -268,6 +269,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 <div class="card">
                     <h3>Recent Conversations</h3>
                     <div id="questions" class="questions-list"></div>
+                    <button id="loadMoreQuestions" onclick="loadMoreQuestions()" style="margin-top: 12px; padding: 8px 16px; border: 1px solid #1e3a8a; border-radius: 8px; background: #fff; color: #1e3a8a; cursor: pointer; display: none;">Load more</button>
                 </div>
             </div>
             <div class="dashboard-grid-4">
@@ -314,6 +316,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     <script>
         const baseUrl = '{base_url}';
         let categoryChart, hourlyChart;
+        // Filters of the loaded summary, and the paging state of the recent conversations list
+        let currentFilters = '';
+        let questionsPage = {{ token: null, done: false, shown: new Set() }};
         function setDefaultDates() {{
             const today = new Date();
             const weekAgo = new Date(today.getTime() - 7 * 24 * 60 * 60 * 1000);
@@ -332,6 +337,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 if (startDate) params.append('startDate', startDate + 'T00:00:00Z');
                 if (endDate) params.append('endDate', endDate + 'T23:59:59Z');
                 if (theme !== 'all') params.append('theme', theme);
+                currentFilters = params.toString();
                 if (params.toString()) url += '?' + params.toString();
                 const response = await fetch(url);
                 const data = await response.json();
@@ -356,6 +362,48 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 }});
             }}
         }}
+        function questionItemHtml(q) {{
+            var titleHtml = 'No question recorded';
+            if (q && q.title) titleHtml = '<a href="/api/conversationviewtitle?title=' + encodeURIComponent(q.title) + '" target="_blank" style="color:#1e3a8a;text-decoration:underline;">' + q.title + '</a>';
+            var date = q && q.createdAt ? new Date(q.createdAt).toLocaleString() : '';
+            var category = q && q.category ? q.category : '';
+            return '<div class="question-item">' +
+                '<div class="question-text">' + titleHtml + '</div>' +
+                '<div class="question-meta">Category: ' + category + ' | ' + date + '</div>' +
+            '</div>';
+        }}
+        // Next page of recent conversations; each click reads one page via GetAnalyticsDrilldown
+        async function loadMoreQuestions() {{
+            if (questionsPage.done) return;
+            const button = document.getElementById('loadMoreQuestions');
+            button.disabled = true;
+            try {{
+                var html = '';
+                // The first page repeats the conversations already shown; keep going until something new turns up
+                while (!html && !questionsPage.done) {{
+                    const params = new URLSearchParams(currentFilters);
+                    params.append('list', 'questions');
+                    params.append('pageSize', '20');
+                    if (questionsPage.token) params.append('continuationToken', questionsPage.token);
+                    const response = await fetch(`${{baseUrl}}/GetAnalyticsDrilldown?` + params.toString());
+                    const page = await response.json();
+                    if (!response.ok) throw new Error(page.error || response.status);
+                    (page.items || []).forEach(function(q) {{
+                        if (q.id && questionsPage.shown.has(q.id)) return;
+                        if (q.id) questionsPage.shown.add(q.id);
+                        html += questionItemHtml(q);
+                    }});
+                    questionsPage.token = page.continuationToken;
+                    questionsPage.done = !page.continuationToken;
+                }}
+                document.getElementById('questions').insertAdjacentHTML('beforeend', html);
+                if (questionsPage.done) button.style.display = 'none';
+            }} catch (error) {{
+                console.error('Error loading more conversations:', error);
+            }} finally {{
+                button.disabled = false;
+            }}
+        }}
         function updateDashboard(data) {{
             // All-time metrics (NEW)
             document.getElementById('allTimeTotalQuestions').textContent = data.allTime?.totalQuestions ?? 'N/A';
@@ -430,18 +478,14 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             }}
             if (data.questions?.recent) {{
                 var questionsHtml = '';
+                questionsPage = {{ token: null, done: false, shown: new Set() }};
                 for (var i = 0; i < data.questions.recent.length; i++) {{
                     var q = data.questions.recent[i];
-                    var titleHtml = 'No question recorded';
-                    if (q && q.title) titleHtml = '<a href="/api/conversationviewtitle?title=' + encodeURIComponent(q.title) + '" target="_blank" style="color:#1e3a8a;text-decoration:underline;">' + q.title + '</a>';
-                    var date = q && q.createdAt ? new Date(q.createdAt).toLocaleString() : '';
-                    var category = q && q.category ? q.category : '';
-                    questionsHtml = questionsHtml + '<div class="question-item">' +
-                        '<div class="question-text">' + titleHtml + '</div>' +
-                        '<div class="question-meta">Category: ' + category + ' | ' + date + '</div>' +
-                    '</div>';
+                    if (q && q.id) questionsPage.shown.add(q.id);
+                    questionsHtml = questionsHtml + questionItemHtml(q);
                 }}
                 document.getElementById('questions').innerHTML = questionsHtml;
+                document.getElementById('loadMoreQuestions').style.display = data.questions.recent.length ? 'inline-block' : 'none';
             }}
             
             // Update citation engagement insights
@@ -537,7 +581,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 </body>
 </html>
         """
-        return func.HttpResponse(
+        return compressed_response(
+            req,
             html_content,
             status_code=200,
             headers={"Content-Type": "text/html"}
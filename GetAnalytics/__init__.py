@@ -2,11 +2,153 @@ import azure.functions as func
 import logging
 import os
 import json
-from collections import Counter, defaultdict
-from datetime import datetime
-from azure.cosmos import CosmosClient, PartitionKey
+import time
+from datetime import datetime, time as day_time
+from shared_code.compression import compressed_response, negotiated_etag
+from shared_code.cosmos_pool import get_container, get_database, get_history_container
+from shared_code.analytics_aggregation import AnalyticsAccumulator, build_analytics_payload, merge_states
+from shared_code.analytics_queries import build_analytics_query, fetch_citation_clicks_async, get_all_time_totals, item_in_range
+from shared_code.response_cache import TTLCache, etag_matches, make_etag
+from shared_code.rollups import get_rollup_container, load_window_states
+from shared_code.theme_taxonomy import get_theme_matcher, refresh_theme_taxonomy
+from shared_code.timing import Timings
+from shared_code.timestamps import parse_naive_utc
+
+
+# Per-worker cache of computed payloads, bounded by their serialized size
+_payload_cache = TTLCache(int(os.environ.get('ANALYTICS_CACHE_MAX_BYTES', str(32 * 1024 * 1024))))
+ALL_TIME_KEY = 'allTime'
+
+
+def live_state(container, container2, start_dt, end_dt, theme_filter, category_filter, timings=None):
+    """
+    Aggregate straight from the raw documents. Used when a theme/category filter
+    is set (rollups are unfiltered) or when no date range is given. Time spent
+    in the Cosmos DB pager, the filters and the aggregation is reported to
+    timings as the "cosmos", "filter" and "aggregate" stages.
+    """
+    timings = timings or Timings('GetAnalytics')
+    # Push the date/theme/category predicates down to Cosmos; the Python
+    # filters below only refine what the query cannot express exactly.
+    theme_param = theme_filter.strip() if theme_filter and theme_filter != 'all' else None
+    category_param = category_filter if category_filter and category_filter != 'all' else None
+    # The theme filter uses the taxonomy behind the theme breakdowns (and the
+    # dashboard's theme list): the query matches any of the theme's keywords,
+    # the matcher then applies word boundaries
+    matcher = get_theme_matcher()
+    query, parameters = build_analytics_query(
+        start_dt=start_dt,
+        end_dt=end_dt,
+        category=category_param,
+        theme=theme_param,
+        theme_keywords=matcher.keywords(theme_param) if theme_param else None,
+    )
+    theme_filter_lc = theme_param.lower() if theme_param else None
+    def has_theme(item):
+        return matcher.has_theme(item, theme_filter_lc)
+
+    def keep(item):
+        # Filter by date and theme/category if provided
+        if start_dt and end_dt and not item_in_range(item, start_dt, end_dt):
+            return False
+        if theme_filter_lc:
+            return has_theme(item)
+        if category_param:
+            return (item.get('category') or item.get('type')) == category_param
+        return True
+
+    # Citation clicks carry no title or themes, so a theme filter excludes all
+    # of them; otherwise fetch them concurrently with the primary container.
+    clicks = None
+    if not theme_filter_lc:
+        clicks = fetch_citation_clicks_async(container2, start_dt, end_dt, category_param,
+                                             response_hook=timings.charge)
+
+    # Stream the primary pager through a single-pass fold; documents are never
+    # collected into a list.
+    accumulator = AnalyticsAccumulator(timings=timings)
+    counts = {'primary': 0, 'secondary': 0, 'kept': 0}
+    clock = time.perf_counter
+    filter_seconds = 0.0
+    aggregate_seconds = 0.0
+    pager = container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True,
+                                  response_hook=timings.charge)
+    for item in timings.timed('cosmos', pager):
+        if counts['primary'] == 0:
+            logging.info(f"GetAnalytics: Sample item: {json.dumps(item, indent=2)}")
+        counts['primary'] += 1
+        started = clock()
+        kept = keep(item)
+        filtered = clock()
+        filter_seconds += filtered - started
+        if kept:
+            accumulator.add(item)
+            counts['kept'] += 1
+            aggregate_seconds += clock() - filtered
+    logging.info(f"GetAnalytics: Retrieved {counts['primary']} items from primary container.")
+
+    # Citation clicks from the secondary database
+    if clicks is not None:
+        try:
+            with timings.stage('clicks'):
+                click_items = clicks.result()
+            for item in click_items:
+                counts['secondary'] += 1
+                if keep(item):
+                    accumulator.add(item)
+                    counts['kept'] += 1
+            logging.info(f"GetAnalytics: Retrieved {counts['secondary']} citation clicks from secondary container.")
+        except Exception as e:
+            logging.warning(f"Could not fetch from secondary container: {e}")
+
+    logging.info(f"GetAnalytics: {counts['kept']} items after filters.")
+    timings.add('filter', filter_seconds)
+    timings.add('aggregate', aggregate_seconds)
+    timings.count('docs', counts['primary'] + counts['secondary'])
+    timings.count('kept', counts['kept'])
+    with timings.stage('aggregate'):
+        return accumulator.state()
+
+
+def compute_payload(container, container2, rollup_container, force_id, rollups_enabled,
+                    start_dt, end_dt, theme_filter, category_filter, timings=None):
+    """The response body for a request, without the allTime totals."""
+    timings = timings or Timings('GetAnalytics')
+    state = None
+    filtered = (theme_filter and theme_filter != 'all') or (category_filter and category_filter != 'all')
+    if rollups_enabled and rollup_container is not None and start_dt and end_dt and not filtered:
+        # Completed days come from daily rollup documents (one point read
+        # each); only the current/partial days are scanned.
+        try:
+            with timings.stage('rollups'):
+                states = load_window_states(container, container2, rollup_container, force_id, start_dt, end_dt)
+                state = merge_states(states)
+        except Exception as e:
+            logging.warning(f"GetAnalytics: rollups unavailable, falling back to live scan: {e}")
+    if state is None:
+        state = live_state(container, container2, start_dt, end_dt, theme_filter, category_filter, timings)
+    with timings.stage('payload'):
+        return build_analytics_payload(state, None)
+
+
+def cache_ttl():
+    return float(os.environ.get('ANALYTICS_CACHE_TTL_SECONDS', '60'))
+
+
+def payload_ttl(end_dt):
+    """
+    Ranges that ended before today (UTC) change rarely, so they live longer;
+    still only minutes, because late citation clicks and edited
+    conversations do arrive for past days (the change feed marks their
+    rollups stale, and a cached payload would hide the rebuild).
+    """
+    if end_dt and end_dt < datetime.combine(datetime.utcnow().date(), day_time.min):
+        return float(os.environ.get('ANALYTICS_CACHE_PAST_TTL_SECONDS', '900'))
+    return cache_ttl()
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    timings = Timings('GetAnalytics')
     try:
         logging.info('GetAnalytics function processed a request.')
         # Cosmos DB connection using endpoint and key (align with GetQuestions)
@@ -14,6 +156,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         key = os.environ.get('COSMOS_DB_KEY')
         database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
         container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        force_id = os.environ.get('FORCE_IDENTIFIER', 'unknown')
+        rollups_enabled = os.environ.get('ANALYTICS_ROLLUPS_ENABLED', 'true').lower() != 'false'
         if not endpoint or not key:
             raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
 
@@ -23,410 +167,89 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         logging.info(f"Cosmos DB database: {database_name}")
         logging.info(f"Cosmos DB container: {container_name}")
 
-        client = CosmosClient(endpoint, key)
-        db = client.get_database_client(database_name)
-        container = db.get_container_client(container_name)
-        
+        # Shared per-process client and container proxies
+        db = get_database(database_name)
+        container = get_container(container_name, database_name)
+
         # Also check the other database for citation clicks
-        db2 = client.get_database_client('db_conversation_history')
-        container2 = db2.get_container_client('Conversations')
+        container2 = get_history_container()
+
+        # The rollup container also holds the theme taxonomy document; reload
+        # the taxonomy if it changed since the last check
+        rollup_container = None
+        try:
+            rollup_container = get_rollup_container(db)
+        except Exception as e:
+            logging.warning(f"GetAnalytics: rollup container unavailable: {e}")
+        with timings.stage('taxonomy'):
+            refresh_theme_taxonomy(rollup_container, force_id)
 
         # Parse date filters from query params
-        from datetime import datetime, timezone
         start_date = req.params.get('startDate')
         end_date = req.params.get('endDate')
         category_filter = req.params.get('category')
         theme_filter = req.params.get('theme')
-        date_filter = None
         start_dt = None
         end_dt = None
         if start_date and end_date:
             try:
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+                # Naive UTC, the same normalization applied to document timestamps
+                start_dt = parse_naive_utc(start_date)
+                end_dt = parse_naive_utc(end_date)
             except Exception as e:
                 logging.warning(f"Invalid date filter: {e}")
-        # Query all items (filtering in Python for flexibility)
-        query = "SELECT * FROM c"
-        items = list(container.query_items(query=query, enable_cross_partition_query=True))
-        logging.info(f"GetAnalytics: Retrieved {len(items)} items from primary container.")
-        
-        # Also fetch citation clicks from the secondary database
-        try:
-            items2 = list(container2.query_items(query=query, enable_cross_partition_query=True))
-            citation_clicks_from_db2 = [item for item in items2 if item.get('type') == 'citation_click']
-            items.extend(citation_clicks_from_db2)
-            logging.info(f"GetAnalytics: Retrieved {len(citation_clicks_from_db2)} citation clicks from secondary container.")
-        except Exception as e:
-            logging.warning(f"Could not fetch from secondary container: {e}")
-        
-        logging.info(f"GetAnalytics: Total {len(items)} items from Cosmos DB.")
-        if items:
-            logging.info(f"GetAnalytics: Sample item: {json.dumps(items[0], indent=2)}")
-        # Filter by date and category if provided
-        filtered_items = items
-        if start_dt and end_dt:
-            # Make start_dt and end_dt naive for comparison with naive DB datetimes
-            if start_dt.tzinfo is not None:
-                start_dt = start_dt.replace(tzinfo=None)
-            if end_dt.tzinfo is not None:
-                end_dt = end_dt.replace(tzinfo=None)
-            def in_range(item):
-                ts = item.get('createdAt') or item.get('timestamp')
-                if not ts:
-                    return False
-                try:
-                    dt = datetime.fromisoformat(ts)
-                    if dt.tzinfo is not None:
-                        dt = dt.replace(tzinfo=None)
-                    return start_dt <= dt <= end_dt
-                except Exception:
-                    return False
-            filtered_items = [item for item in filtered_items if in_range(item)]
-            logging.info(f"GetAnalytics: {len(filtered_items)} items after date filter.")
-        if theme_filter and theme_filter != 'all':
-            theme_filter_lc = theme_filter.strip().lower()
-            def has_theme(item):
-                # Match if the theme keyword appears anywhere in the title (case-insensitive substring)
-                title = (item.get('title') or '').lower()
-                if theme_filter_lc in title:
-                    return True
-                # Also check in the item's themes list (case-insensitive)
-                themes_list = [str(t).strip().lower() for t in item.get('themes', []) if t]
-                return any(theme_filter_lc in t for t in themes_list)
-            filtered_items = [item for item in filtered_items if has_theme(item)]
-            logging.info(f"GetAnalytics: {len(filtered_items)} items after theme filter.")
-        elif category_filter and category_filter != 'all':
-            filtered_items = [item for item in filtered_items if (item.get('category') or item.get('type')) == category_filter]
-            logging.info(f"GetAnalytics: {len(filtered_items)} items after category filter.")
-        items = filtered_items
-
-        # Conversation title breakdown (AI-generated overviews, filtered period)
-        conversation_title_counter = Counter()
-        for item in items:
-            if item.get('type') == 'conversation':
-                title = (item.get('title') or '').strip()
-                if title:
-                    conversation_title_counter[title] += 1
-        conversation_title_breakdown = [
-            {"title": title, "count": count}
-            for title, count in conversation_title_counter.most_common(10)
-        ]
+                start_dt = end_dt = None
+
+        # Cached payloads are keyed on the normalized filters and the taxonomy
+        # they were computed with; allTime is cached separately (short TTL)
+        # so long-lived entries for past ranges never serve stale totals.
+        theme_key = theme_filter.strip().lower() if theme_filter and theme_filter != 'all' else None
+        category_key = category_filter if category_filter and category_filter != 'all' else None
+        cache_key = (
+            start_dt.isoformat() if start_dt else None,
+            end_dt.isoformat() if end_dt else None,
+            theme_key,
+            category_key,
+            get_theme_matcher().version,
+        )
+        payload = _payload_cache.get(cache_key)
+        if payload is None:
+            payload = compute_payload(container, container2, rollup_container, force_id, rollups_enabled,
+                                      start_dt, end_dt, theme_filter, category_filter, timings)
+            _payload_cache.set(cache_key, payload, ttl=payload_ttl(end_dt), size=len(json.dumps(payload)))
+        else:
+            logging.info("GetAnalytics: served from the response cache.")
+            timings.count('cacheHit')
 
         # --- All-time totals (before filtering) ---
-        # Re-query all items for all-time stats (not filtered)
-        all_items = list(container.query_items(query="SELECT * FROM c", enable_cross_partition_query=True))
-        all_time_total_questions = sum(1 for item in all_items if item.get('role') == 'user')
-        all_time_unique_users = len(set(item.get('userId') for item in all_items if item.get('role') == 'user' and item.get('userId')))
-
-        total_interactions = len(items)
-        unique_users = set()
-        total_questions = 0
-        total_user_questions = sum(1 for item in items if item.get('role') == 'user')
-        categories = Counter()
-        themes = Counter()
-        hourly_distribution = [0]*24
-        recent_questions = []
-        response_times = []
-        # Pre-index all responses by conversationId for fast lookup
-        responses_by_conversation = defaultdict(list)
-        for item in items:
-            if item.get('type') == 'message' and item.get('role') == 'tool' and item.get('conversationId'):
-                responses_by_conversation[item['conversationId']].append(item)
-
-        # Theme keywords (expand as needed)
-        theme_keywords = [
-            'stalking', 'domestic abuse', 'warrant', 'warrants', 'theft', 'burglary', 'assault',
-            'missing', 'runaway', 'violence', 'abuse', 'drugs', 'alcohol', 'mental health',
-            'child', 'safeguarding', 'investigation', 'arrest', 'bail', 'custody', 'suicide',
-            'complaint', 'noise', 'property', 'traffic', 'crime', 'enquiry', 'lost', 'report',
-        ]
-
-        # Citation tracking
-        citation_sources = defaultdict(lambda: {'count': 0, 'questions': set()})
-        unmatched_samples = []  # Store sample unmatched citations for debugging
-        citation_categories = {
-            'CoP-APP': ['cop-app', 'cop app', 'college of policing', 'authorised professional practice', 'cop-detention', 'cop-general'],
-            'Op Soteria-NOM': ['op soteria-nom', 'op soteria', 'opsoteria', 'operation soteria', 'soteria'],
-            'NPCC': ['npcc-', 'npcc ', 'national police chiefs', 'gravity-matrix', 'oocr-'],
-            'GovUK-CPS': ['govuk-cps-', 'govuk cps', 'cps.gov.uk', 'crown prosecution service', 'cps guidance'],
-            'GovUK-Legislation': ['govuk-legislation', 'legislation.gov.uk'],
-            'GovUK-HO': ['govuk-ho-', 'govuk ho', 'home office guidance', 'notifiable-offence'],
-            'GovUK-MoJ': ['govuk-moj-', 'govuk moj', 'ministry of justice', 'cautions-guidance'],
-            'RCJ': ['rcj-', 'royal courts of justice'],
-            'VKPP': ['vkpp-', 'victims\' commissioner', 'victims commissioner'],
-            'Sentencing Council': ['sent-coun-', 'sentencing council', 'sentencing guidelines'],
-            'BTP-Records-Management': ['btp-records-management-'],
-            'BTP-Policy': ['btp-policy-'],
-            'Stop & Search': ['stop and search', 'stop & search', 'stop search'],
-            'PACE': ['pace-', 'police and criminal evidence act'],
-            'SCRS': ['scrs ', 'scrs crime manual', 'scotland'],
-            'Other Documents': [],  # Catch-all for unmatched citations
-        }
-        
-        # Citation click tracking
-        citation_clicks = set()  # Track unique conversations with citation clicks
-        total_citation_clicks = 0
-        conversations_with_citations = set()
-        
-        # Conversation metrics
-        conversation_message_counts = defaultdict(int)
-        user_conversation_count = defaultdict(int)
-        returning_users = set()
-        user_first_seen = {}
-        conversations_with_responses = set()
-
-        for item in items:
-            item_type = item.get('type')
-            
-            # Track citation clicks
-            if item_type == 'citation_click':
-                conv_id = item.get('conversationId')
-                if conv_id:
-                    citation_clicks.add(conv_id)
-                    total_citation_clicks += 1
-            
-            # Track conversation message counts
-            if item_type == 'message':
-                conv_id = item.get('conversationId')
-                if conv_id:
-                    conversation_message_counts[conv_id] += 1
-            
-            # Track returning users
-            user_id = item.get('userId')
-            if user_id:
-                unique_users.add(user_id)
-                ts = item.get('createdAt') or item.get('timestamp')
-                if ts:
-                    try:
-                        dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                        if user_id not in user_first_seen:
-                            user_first_seen[user_id] = dt
-                        else:
-                            # If we've seen this user before in a different period, they're returning
-                            time_diff = (dt - user_first_seen[user_id]).days
-                            if time_diff > 0:
-                                returning_users.add(user_id)
-                    except Exception:
-                        pass
-            
-            # Count conversations per user
-            if item_type == 'conversation':
-                if user_id:
-                    user_conversation_count[user_id] += 1
-            
-            # Category
-            cat = item.get('category') or item_type
-            if cat:
-                categories[cat] += 1
-            
-            # Hourly distribution
-            ts = item.get('createdAt') or item.get('timestamp')
-            if ts:
-                try:
-                    dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                    hourly_distribution[dt.hour] += 1
-                except Exception:
-                    pass
-            
-            # Extract citations from tool messages
-            if item.get('role') == 'tool':
-                conv_id = item.get('conversationId')
-                if conv_id:
-                    conversations_with_responses.add(conv_id)
-                try:
-                    content = item.get('content', '')
-                    tool_data = json.loads(content) if isinstance(content, str) else content
-                    citations = tool_data.get('citations') if isinstance(tool_data, dict) else None
-                    if citations and isinstance(citations, list):
-                        # Track conversations that have citations
-                        if conv_id:
-                            conversations_with_citations.add(conv_id)
-                        
-                        # Track total citations processed for logging
-                        total_citations_processed = sum(src['count'] for src in citation_sources.values())
-                        
-                        for citation in citations:
-                            title = citation.get('title', '').lower()
-                            # Log first 50 citation titles for debugging to understand patterns
-                            if total_citations_processed < 50:
-                                logging.info(f"Citation title: {title}")
-                            
-                            # Categorize citation by source
-                            matched = False
-                            for source_name, keywords in citation_categories.items():
-                                if source_name == 'Other Documents':
-                                    continue  # Skip "Other Documents" in the loop
-                                if keywords and any(keyword in title for keyword in keywords):
-                                    citation_sources[source_name]['count'] += 1
-                                    if conv_id:
-                                        citation_sources[source_name]['questions'].add(conv_id)
-                                    matched = True
-                                    break
-                            # If no category matched, categorize as "Other Documents"
-                            if not matched:
-                                citation_sources['Other Documents']['count'] += 1
-                                if conv_id:
-                                    citation_sources['Other Documents']['questions'].add(conv_id)
-                                # Log unmatched citations to help identify new patterns
-                                if total_citations_processed < 50:
-                                    logging.warning(f"Unmatched citation: {title}")
-                                # Store first 20 unmatched samples for API response
-                                if len(unmatched_samples) < 20:
-                                    unmatched_samples.append(title)
-                                
-                            total_citations_processed += 1
-                except Exception as e:
-                    logging.warning(f"Error parsing citations: {e}")
-                    pass
-            
-            # Questions (user questions)
-            if item.get('type') == 'conversation' and (item.get('title') or item.get('question')):
-                total_questions += 1
-                qid = item.get('id')
-                # Find first AI response for this question
-                resp_time = None
-                if qid and qid in responses_by_conversation:
-                    # Sort responses by createdAt
-                    responses = sorted(responses_by_conversation[qid], key=lambda r: r.get('createdAt') or '')
-                    if responses:
-                        try:
-                            dt_q = datetime.fromisoformat(item['createdAt'].replace('Z', '+00:00'))
-                            dt_r = datetime.fromisoformat(responses[0]['createdAt'].replace('Z', '+00:00'))
-                            delta = (dt_r - dt_q).total_seconds()
-                            if delta >= 0:
-                                response_times.append(delta)
-                                resp_time = delta
-                        except Exception:
-                            pass
-                # Theme extraction from title
-                title = (item.get('title') or '').lower()
-                found_themes = [kw for kw in theme_keywords if kw in title]
-                for theme in found_themes:
-                    themes[theme] += 1
-                recent_questions.append({
-                    'title': item.get('title') or item.get('question'),
-                    'category': cat,
-                    'userId': user_id,
-                    'createdAt': item.get('createdAt'),
-                    'updatedAt': item.get('updatedAt'),
-                    'type': item.get('type'),
-                    'id': item.get('id'),
-                    'themes': found_themes,
-                    'responseTimeSeconds': resp_time,
-                })
-
-        # Sort recent questions by createdAt desc
-        recent_questions = sorted(recent_questions, key=lambda x: x.get('createdAt') or '', reverse=True)[:20]
-
-
-        # Conversation themes breakdown (group conversations by theme)
-        # Only consider 'conversation' type items
-        conversation_theme_counter = Counter()
-        for item in items:
-            if item.get('type') == 'conversation':
-                conv_themes = item.get('themes', [])
-                # If themes not present, try to extract from title
-                if not conv_themes:
-                    title = (item.get('title') or '').lower()
-                    conv_themes = [kw for kw in theme_keywords if kw in title]
-                for theme in conv_themes:
-                    conversation_theme_counter[theme] += 1
-
-        conversation_themes_breakdown = [
-            {"theme": theme, "count": count}
-            for theme, count in conversation_theme_counter.most_common()
-        ]
-
-        # Top themes (by category/type)
-        top_themes = [{'theme': k, 'count': v} for k, v in themes.most_common(5)]
-
-        # Peak usage hour
-        peak_hour = hourly_distribution.index(max(hourly_distribution)) if any(hourly_distribution) else None
-
-        # Calculate additional metrics
-        avg_response_time = round(sum(response_times)/len(response_times), 2) if response_times else None
-        
-        # Citation engagement metrics
-        conversations_with_citations_count = len(conversations_with_citations)
-        conversations_with_clicks_count = len(citation_clicks)
-        citation_engagement_rate = round((conversations_with_clicks_count / conversations_with_citations_count * 100), 1) if conversations_with_citations_count > 0 else 0
-        
-        # Conversation length metrics
-        avg_messages_per_conversation = round(sum(conversation_message_counts.values()) / len(conversation_message_counts), 1) if conversation_message_counts else 0
-        
-        # User engagement metrics
-        avg_conversations_per_user = round(sum(user_conversation_count.values()) / len(user_conversation_count), 1) if user_conversation_count else 0
-        returning_user_rate = round((len(returning_users) / len(unique_users) * 100), 1) if len(unique_users) > 0 else 0
-        
-        # Response quality metrics
-        responses_with_citations_rate = round((conversations_with_citations_count / len(conversations_with_responses) * 100), 1) if conversations_with_responses else 0
-        
-        # Format citations data for response
-        total_citations = sum(data['count'] for data in citation_sources.values())
-        citations_breakdown = [
-            {
-                "source": source_name,
-                "totalCitations": data['count'],
-                "questionsCount": len(data['questions']),
-                "percentage": round((data['count'] / total_citations * 100), 1) if total_citations > 0 else 0,
-                "avgPerQuestion": round(data['count'] / len(data['questions']), 1) if len(data['questions']) > 0 else 0
-            }
-            for source_name, data in sorted(citation_sources.items(), key=lambda x: x[1]['count'], reverse=True)
-        ]
-        
-        data = {
-            "summary": {
-                "totalInteractions": total_interactions,
-                "uniqueUsers": len(unique_users),
-                "totalQuestions": total_questions,
-                "totalUserQuestions": total_user_questions,
-                "peakUsageHour": peak_hour,
-                "avgResponseTimeSeconds": avg_response_time,
-                "avgMessagesPerConversation": avg_messages_per_conversation,
-                "avgConversationsPerUser": avg_conversations_per_user,
-                "returningUserRate": returning_user_rate
-            },
-            "categories": {k: {"count": v} for k, v in categories.items()},
-            "themes": {"top_themes": top_themes},
-            "conversationThemesBreakdown": conversation_themes_breakdown,
-            "conversationTitleBreakdown": conversation_title_breakdown,
-            "trends": {"hourly_distribution": hourly_distribution},
-            "questions": {"recent": recent_questions},
-            "citations": {
-                "breakdown": citations_breakdown,
-                "totalCitations": sum(c['totalCitations'] for c in citations_breakdown),
-                "totalQuestionsWithCitations": len(set().union(*[data['questions'] for data in citation_sources.values()])) if citation_sources else 0,
-                "unmatchedSamples": unmatched_samples,  # Debug: show sample unmatched citations
-                "conversationsWithCitations": conversations_with_citations_count,
-                "conversationsWithClicks": conversations_with_clicks_count,
-                "citationEngagementRate": citation_engagement_rate,
-                "totalCitationClicks": total_citation_clicks,
-                "responsesWithCitationsRate": responses_with_citations_rate
-            },
-            # --- Engagement metrics ---
-            "engagement": {
-                "avgMessagesPerConversation": avg_messages_per_conversation,
-                "avgConversationsPerUser": avg_conversations_per_user,
-                "returningUserRate": returning_user_rate,
-                "totalReturningUsers": len(returning_users),
-                "citationCheckRate": citation_engagement_rate
-            },
-            # --- NEW FIELD: allTime ---
-            "allTime": {
-                "totalQuestions": all_time_total_questions,
-                "uniqueUsers": all_time_unique_users
-            }
-        }
-        return func.HttpResponse(
-            json.dumps(data),
-            status_code=200,
-            mimetype="application/json"
-        )
+        # Server-side aggregates; the unfiltered documents are never fetched
+        all_time_totals = _payload_cache.get(ALL_TIME_KEY)
+        if all_time_totals is None:
+            with timings.stage('allTime'):
+                all_time_totals = get_all_time_totals(container, response_hook=timings.charge)
+            _payload_cache.set(ALL_TIME_KEY, all_time_totals, ttl=cache_ttl())
+
+        data = dict(payload, allTime=all_time_totals)
+        with timings.stage('serialize'):
+            body = json.dumps(data)
+            etag = make_etag(body)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(req.headers.get('If-None-Match'), etag):
+            headers.update({"ETag": negotiated_etag(req, etag, len(body)), "Vary": "Accept-Encoding"})
+            return timings.finish(func.HttpResponse(status_code=304, headers=headers))
+        with timings.stage('compress'):
+            response = compressed_response(
+                req,
+                body,
+                status_code=200,
+                mimetype="application/json",
+                headers=headers
+            )
+        return timings.finish(response)
     except Exception as e:
         logging.error(f"GetAnalytics error: {str(e)}")
-        return func.HttpResponse(
+        return timings.finish(func.HttpResponse(
             json.dumps({"error": str(e)}),
             status_code=500,
             mimetype="application/json"
-        )
+        ))
@@ -0,0 +1,137 @@
+import azure.functions as func
+import logging
+import os
+import json
+from azure.cosmos import exceptions
+from shared_code.compression import compressed_response
+from shared_code.cosmos_pool import get_container, get_database
+from shared_code.analytics_aggregation import question_entry
+from shared_code.analytics_queries import QUESTION_FIELDS, build_analytics_query, fetch_page, item_in_range
+from shared_code.rollups import get_rollup_container
+from shared_code.theme_taxonomy import refresh_theme_taxonomy
+from shared_code.timestamps import parse_naive_utc
+from shared_code.timing import Timings
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+LISTS = ('questions', 'titles')
+
+
+def _error(message, status_code=400):
+    return func.HttpResponse(
+        json.dumps({"error": message}),
+        status_code=status_code,
+        mimetype="application/json"
+    )
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Paged drill-down lists behind the GetAnalytics summary, newest first:
+    - list=questions: question records (optionally for one theme/category)
+    - list=titles: conversation ids and titles
+    Takes the same startDate/endDate/theme/category filters as GetAnalytics,
+    plus pageSize (default 20, max 100) and the continuationToken returned
+    by the previous page. Each call reads a single page from Cosmos DB.
+
+    Pages are ordered by createdAt alone: Cosmos DB cannot ORDER BY the
+    createdAt-else-timestamp fallback the date filter uses, so legacy
+    documents that only carry timestamp come after every dated one, in no
+    particular order among themselves (as in GetAnalytics' recent questions,
+    which also sort on createdAt).
+    """
+    timings = Timings('GetAnalyticsDrilldown')
+    try:
+        logging.info('GetAnalyticsDrilldown function processed a request.')
+        endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
+        key = os.environ.get('COSMOS_DB_KEY')
+        database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+        container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        force_id = os.environ.get('FORCE_IDENTIFIER', 'unknown')
+        if not endpoint or not key:
+            raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+
+        list_name = req.params.get('list', 'questions')
+        if list_name not in LISTS:
+            return _error(f"list must be one of: {', '.join(LISTS)}")
+        try:
+            page_size = min(max(int(req.params.get('pageSize', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return _error("pageSize must be an integer")
+
+        start_date = req.params.get('startDate')
+        end_date = req.params.get('endDate')
+        start_dt = None
+        end_dt = None
+        if start_date and end_date:
+            try:
+                start_dt = parse_naive_utc(start_date)
+                end_dt = parse_naive_utc(end_date)
+            except ValueError as e:
+                return _error(f"Invalid date filter: {e}")
+        theme_filter = req.params.get('theme')
+        category_filter = req.params.get('category')
+        theme_param = theme_filter.strip() if theme_filter and theme_filter != 'all' else None
+        category_param = category_filter if category_filter and category_filter != 'all' else None
+
+        # Themes are tagged, and the theme filter applied, with the same
+        # taxonomy as GetAnalytics
+        rollup_container = None
+        try:
+            rollup_container = get_rollup_container(get_database(database_name))
+        except Exception as e:
+            logging.warning(f"GetAnalyticsDrilldown: rollup container unavailable: {e}")
+        matcher = refresh_theme_taxonomy(rollup_container, force_id)
+
+        query, parameters = build_analytics_query(
+            start_dt=start_dt,
+            end_dt=end_dt,
+            category=category_param,
+            theme=theme_param,
+            theme_keywords=matcher.keywords(theme_param) if theme_param else None,
+            types=['conversation'],
+            fields=QUESTION_FIELDS,
+            tool_content=False,
+            order_by='createdAt'
+        )
+
+        def keep(item):
+            # Exact date check; the query's date bounds are a superset
+            if start_dt and end_dt and not item_in_range(item, start_dt, end_dt):
+                return False
+            if theme_param and not matcher.has_theme(item, theme_param):
+                return False
+            return bool(item.get('title') or item.get('question'))
+
+        container = get_container(container_name, database_name)
+        try:
+            with timings.stage('cosmos'):
+                items, token = fetch_page(container, query, parameters, page_size,
+                                          req.params.get('continuationToken') or None, keep,
+                                          response_hook=timings.charge)
+            timings.count('docs', len(items))
+        except exceptions.CosmosHttpResponseError as e:
+            if e.status_code == 400:
+                return _error("Invalid continuationToken")
+            raise
+
+        if list_name == 'titles':
+            entries = [{'id': item.get('id'), 'title': item.get('title') or item.get('question'),
+                        'createdAt': item.get('createdAt')} for item in items]
+        else:
+            entries = [
+                question_entry(item, item.get('category') or item.get('type'),
+                               list(matcher.match((item.get('title') or '').strip())))
+                for item in items
+            ]
+        body = json.dumps({"items": entries, "continuationToken": token, "pageSize": page_size})
+        return timings.finish(compressed_response(
+            req,
+            body,
+            status_code=200,
+            mimetype="application/json",
+            headers={"Cache-Control": "private, no-cache"}
+        ))
+    except Exception as e:
+        logging.error(f"GetAnalyticsDrilldown error: {str(e)}")
+        return timings.finish(_error(str(e), status_code=500))
@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 import azure.functions as func
 
 try:
-    from azure.cosmos import CosmosClient
+    from shared_code.cosmos_pool import get_container
     cosmos_available = True
 except ImportError as e:
     cosmos_available = False
@@ -63,8 +63,6 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 def get_detailed_questions(force_id, start_date, end_date, category, limit):
-    from azure.cosmos import CosmosClient
-
     # Get Cosmos DB configuration
     endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
     key = os.environ.get('COSMOS_DB_KEY')
@@ -80,10 +78,8 @@ def get_detailed_questions(force_id, start_date, end_date, category, limit):
     if not endpoint or not key:
         raise Exception("Cosmos DB configuration not found")
 
-    # Initialize Cosmos client
-    client = CosmosClient(endpoint, key)
-    database = client.get_database_client(database_name)
-    container = database.get_container_client(container_name)
+    # Shared per-process Cosmos client
+    container = get_container(container_name, database_name)
 
     # Build query based on category filter
     if category != 'all':
@@ -0,0 +1,41 @@
+import logging
+import os
+import azure.functions as func
+from shared_code.cosmos_pool import get_database, get_history_container
+from shared_code.change_feed import apply_changes
+from shared_code.enrichment import enrich_documents
+from shared_code.title_index import TITLE_FIELD
+from shared_code.rollups import get_rollup_container
+
+def main(documents: func.DocumentList) -> None:
+    """
+    Change feed consumer for db_conversation_history/Conversations.
+    Marks the daily rollups of the days that new and updated citation clicks
+    touch as stale, and stores titleLower on conversations for the title
+    viewers. Tool messages get no citation summary here: analytics and
+    exports read only citation clicks from this container, so that would be
+    a write into the chat app's live container that nothing reads. Lease
+    checkpoints are handled by the trigger; raising makes the batch retry, and
+    apply_changes is idempotent for re-delivered documents.
+    """
+    if not documents:
+        return
+    logging.info(f"HistoryChangeFeed received {len(documents)} documents.")
+    endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
+    key = os.environ.get('COSMOS_DB_KEY')
+    database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+    force_id = os.environ.get('FORCE_IDENTIFIER', 'unknown')
+    if not endpoint or not key:
+        raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+
+    db = get_database(database_name)
+    # Only citation clicks from this container feed the dashboard; enriched
+    # conversations coming back through the feed are not clicks
+    docs = [doc.to_dict() for doc in documents]
+    clicks = [doc for doc in docs if doc.get('type') == 'citation_click']
+    if clicks:
+        apply_changes(clicks, 'history', get_rollup_container(db), force_id)
+
+    enriched = enrich_documents(get_history_container(), docs, names=(TITLE_FIELD,))
+    if enriched:
+        logging.info(f"HistoryChangeFeed enriched {enriched} documents.")
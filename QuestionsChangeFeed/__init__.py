@@ -0,0 +1,40 @@
+import logging
+import os
+import azure.functions as func
+from shared_code.cosmos_pool import get_container, get_database
+from shared_code.change_feed import apply_changes
+from shared_code.enrichment import enrich_documents, is_enrichment_write
+from shared_code.rollups import get_rollup_container
+
+def main(documents: func.DocumentList) -> None:
+    """
+    Change feed consumer for the questions container.
+    Marks the daily rollups of the days that new and updated documents touch
+    as stale, and stores the derived fields (citation summary, titleLower) on
+    documents that lack them. Versions written by that enrichment come back
+    through the feed and are skipped. Lease checkpoints are handled by the
+    trigger; raising makes the batch retry, and both steps are idempotent
+    for re-delivered documents.
+    """
+    if not documents:
+        return
+    logging.info(f"QuestionsChangeFeed received {len(documents)} documents.")
+    endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
+    key = os.environ.get('COSMOS_DB_KEY')
+    database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+    force_id = os.environ.get('FORCE_IDENTIFIER', 'unknown')
+    if not endpoint or not key:
+        raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+
+    db = get_database(database_name)
+    docs = [doc.to_dict() for doc in documents]
+    changed = [doc for doc in docs if not is_enrichment_write(doc)]
+    if changed:
+        apply_changes(changed, 'questions', get_rollup_container(db), force_id)
+
+    # Write-time enrichment: the rewritten documents come back through the
+    # feed once more, already carrying their derived fields
+    container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+    enriched = enrich_documents(get_container(container_name, database_name), docs)
+    if enriched:
+        logging.info(f"QuestionsChangeFeed enriched {enriched} documents.")
@@ -3,7 +3,21 @@ import logging
 import json
 import os
 from datetime import datetime
-from azure.cosmos import CosmosClient
+from shared_code.cosmos_pool import HISTORY_CONTAINER, HISTORY_DATABASE, get_container
+
+
+def allowed_targets():
+    """
+    The (database, container) pairs clicks may be written to: the configured
+    questions container and the conversation history container, which are the
+    ones the conversation views embed in their pages. Anything else is
+    rejected before it reaches the pooled client cache.
+    """
+    return {
+        (os.environ.get('COSMOS_DB_DATABASE', 'coppa-db'), os.environ.get('COSMOS_DB_CONTAINER', 'questions')),
+        (HISTORY_DATABASE, HISTORY_CONTAINER)
+    }
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -13,7 +27,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         "citationTitle": "string",
         "citationUrl": "string",
         "userId": "string",
-        "timestamp": "ISO datetime string"
+        "timestamp": "ISO datetime string",
+        "databaseName": "optional; see allowed_targets",
+        "containerName": "optional; see allowed_targets"
     }
     """
     try:
@@ -43,18 +59,18 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         # Cosmos DB connection
-        endpoint = os.environ.get('COSMOS_DB_ENDPOINT')
-        key = os.environ.get('COSMOS_DB_KEY')
         # Allow database/container to be specified in request, otherwise use environment defaults
         database_name = req_body.get('databaseName') or os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
         container_name = req_body.get('containerName') or os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        if (database_name, container_name) not in allowed_targets():
+            return func.HttpResponse(
+                json.dumps({"error": "Unknown databaseName/containerName"}),
+                status_code=400,
+                mimetype="application/json"
+            )
         
-        if not endpoint or not key:
-            raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
-        
-        client = CosmosClient(endpoint, key)
-        db = client.get_database_client(database_name)
-        container = db.get_container_client(container_name)
+        # Shared per-process client; connections and metadata are reused across invocations
+        container = get_container(container_name, database_name)
         
         # Create citation click event document
         click_event = {
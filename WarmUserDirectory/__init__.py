@@ -0,0 +1,64 @@
+import azure.functions as func
+import logging
+import os
+import json
+from datetime import datetime, timedelta
+from shared_code.analytics_queries import fetch_user_ids
+from shared_code.cosmos_pool import get_container, get_database
+from shared_code.graph_auth import get_token_provider
+from shared_code.user_directory import get_user_directory_container, resolve_users
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Bulk warm-up of the user directory used by ExportToCSV: looks up every
+    user active in the last `days` (default 30) that is not in the directory
+    yet, so the next exports make no Graph calls. refresh=true looks them all
+    up again. Schedule it after a change of staff or run it before a large
+    export.
+    """
+    try:
+        logging.info('WarmUserDirectory function processed a request.')
+        database_name = os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+        container_name = os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+        try:
+            days = int(req.params.get('days', '30'))
+        except ValueError:
+            return func.HttpResponse(
+                json.dumps({"error": "days must be an integer"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        refresh = req.params.get('refresh', 'false').lower() == 'true'
+
+        token_provider = get_token_provider()
+        if token_provider is None:
+            return func.HttpResponse(
+                json.dumps({"error": "Graph API credentials not configured"}),
+                status_code=500,
+                mimetype="application/json"
+            )
+        result = token_provider.acquire_token()
+        if "access_token" not in result:
+            return func.HttpResponse(
+                json.dumps({"error": f"Failed to obtain Graph API token: {result.get('error_description')}"}),
+                status_code=500,
+                mimetype="application/json"
+            )
+
+        end_dt = datetime.utcnow()
+        user_ids = fetch_user_ids(get_container(container_name, database_name), end_dt - timedelta(days=days), end_dt)
+        directory = get_user_directory_container(get_database(database_name))
+        _, counts = resolve_users(user_ids, result["access_token"], directory, refresh=refresh)
+        logging.info(f"WarmUserDirectory: {counts}")
+        return func.HttpResponse(
+            json.dumps(counts),
+            status_code=200,
+            mimetype="application/json"
+        )
+    except Exception as e:
+        logging.error(f"WarmUserDirectory error: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: shared citation classifier vs the per-citation keyword loop
+it replaced in GetAnalytics.
+
+Usage: python benchmarks/bench_citation_classifier.py [citations] [distinct titles]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared_code.citation_classifier import CITATION_SOURCES, OTHER_SOURCE, _classify, classify_citation, classify_many
+
+SAMPLE_TITLES = [
+    'cop-app-stalking-and-harassment.pdf', 'College of Policing - Authorised Professional Practice: Detention',
+    'npcc-gravity-matrix-2023.pdf', 'legislation.gov.uk - Bail Act 1976 s3', 'govuk-cps-charging-standard.pdf',
+    'govuk-ho-notifiable-offence-list.pdf', 'Sentencing Council guidelines - theft', 'pace-code-c-2019.pdf',
+    'BTP-Policy-Lost-Property.docx', 'Op Soteria national operating model', 'scrs crime manual chapter 4',
+    'Local force intranet guidance note', 'Victims Commissioner annual report', 'rcj-judgment-2021-ewca',
+]
+
+
+def legacy_classify(title):
+    """The loop GetAnalytics used before the shared classifier."""
+    for source_name, keywords in CITATION_SOURCES.items():
+        if keywords and any(keyword in title for keyword in keywords):
+            return source_name
+    return OTHER_SOURCE
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    random.seed(42)
+    pool = [f"{random.choice(SAMPLE_TITLES)} v{i}" for i in range(distinct)]
+    titles = [random.choice(pool) for _ in range(total)]
+    lowered = [t.lower() for t in titles]
+
+    mismatches = sum(1 for t in lowered if legacy_classify(t) != classify_citation(t))
+    print(f"{total} citations, {distinct} distinct titles, {mismatches} mismatches vs legacy loop")
+
+    def run_legacy():
+        for t in lowered:
+            legacy_classify(t)
+
+    def run_uncached():
+        for t in lowered:
+            _classify.__wrapped__(t)
+
+    def run_cold():
+        _classify.cache_clear()
+        for t in lowered:
+            classify_citation(t)
+
+    def run_warm():
+        for t in lowered:
+            classify_citation(t)
+
+    def run_batch():
+        classify_many(lowered)
+
+    run_warm()
+    for name, fn in [('legacy loop', run_legacy), ('compiled (no cache)', run_uncached),
+                     ('compiled (cold cache)', run_cold),
+                     ('compiled (warm cache)', run_warm), ('classify_many', run_batch)]:
+        seconds = min(timeit.repeat(fn, number=1, repeat=3))
+        print(f"{name:24s} {seconds * 1000:9.1f} ms  {total / seconds / 1e6:6.2f} M citations/s")
+
+
+if __name__ == '__main__':
+    main()
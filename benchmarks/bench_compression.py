@@ -0,0 +1,78 @@
+"""
+Bytes on the wire and CPU cost of response compression for the three large
+responses: the GetAnalytics JSON, the Dashboard page and an ExportToCSV body.
+
+Usage: python benchmarks/bench_compression.py [csv rows]
+"""
+import csv
+import io
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import azure.functions as func
+
+from shared_code.analytics_aggregation import aggregate_items, build_analytics_payload
+from shared_code.compression import compress_body, supported_encodings
+
+TITLES = [
+    'Bail conditions after arrest for burglary', 'Stalking protection order guidance',
+    'Domestic abuse risk assessment', 'Missing child report procedure', 'Custody review timings',
+    'Noise complaint powers', 'Theft from vehicle investigation', 'Mental health detention s136',
+]
+CITATIONS = ['cop-app-detention.pdf', 'npcc-gravity-matrix.pdf', 'legislation.gov.uk - PACE 1984', 'local-guidance.docx']
+
+
+def analytics_body(conversations=2000):
+    random.seed(1)
+    docs = []
+    for i in range(conversations):
+        created = f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00"
+        docs.append({'id': f'c{i}', 'type': 'conversation', 'title': f"{random.choice(TITLES)} #{i}",
+                     'userId': f'u{i % 150}', 'createdAt': created})
+        content = json.dumps({'citations': [{'title': random.choice(CITATIONS)} for _ in range(3)]})
+        docs.append({'id': f'm{i}', 'type': 'message', 'role': 'tool', 'conversationId': f'c{i}',
+                     'content': content, 'createdAt': created})
+    payload = build_analytics_payload(aggregate_items(docs), {'totalQuestions': 100000, 'uniqueUsers': 900})
+    return json.dumps(payload).encode('utf-8')
+
+
+def dashboard_body():
+    import Dashboard
+    req = func.HttpRequest(method='GET', url='http://localhost/api/Dashboard', headers={'host': 'localhost'}, body=b'')
+    return Dashboard.main(req).get_body()
+
+
+def csv_body(rows):
+    random.seed(2)
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+    writer.writerow(['ID', 'Conversation ID', 'Type', 'Role', 'Content', 'User ID', 'User Name',
+                     'User Email', 'Created At', 'Has Citations', 'Citation Count', 'Citation Titles', 'Citation Sources'])
+    for i in range(rows):
+        writer.writerow([f'm{i}', f'c{i // 4}', 'message', random.choice(['user', 'assistant', 'tool']),
+                         random.choice(TITLES) + ' ' + 'lorem ipsum ' * random.randint(5, 40), f'u{i % 150}',
+                         f'Officer {i % 150}', f'officer{i % 150}@force.police.uk', '2025-01-05T10:00:00',
+                         'Yes', 2, ' | '.join(random.sample(CITATIONS, 2)), 'CoP-APP | NPCC'])
+    return output.getvalue().encode('utf-8')
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    bodies = [('GetAnalytics', analytics_body()), ('Dashboard', dashboard_body()), ('ExportToCSV', csv_body(rows))]
+    print(f"{'endpoint':<14}{'encoding':<10}{'bytes':>12}{'ratio':>8}{'cpu ms':>10}")
+    for name, body in bodies:
+        print(f"{name:<14}{'identity':<10}{len(body):>12}{1.0:>8.2f}{0.0:>10.2f}")
+        for encoding in supported_encodings():
+            compressed = compress_body(body, encoding)
+            runs = 5
+            seconds = timeit.timeit(lambda: compress_body(body, encoding), number=runs) / runs
+            print(f"{'':<14}{encoding:<10}{len(compressed):>12}{len(body) / len(compressed):>8.2f}{seconds * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
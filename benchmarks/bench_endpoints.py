@@ -0,0 +1,183 @@
+"""
+Offline benchmark of the analytics endpoints against an in-memory Cosmos DB
+stand-in (benchmarks/fake_cosmos.py) loaded with synthetic data
+(benchmarks/synthetic_data.py).
+
+Each endpoint/scale pair runs in a fresh process and reports the latency per
+call, peak RSS (and its growth over the loaded dataset) and, per call, the
+queries issued and the documents the fake Cosmos DB evaluated ("scanned";
+the fake has no indexes, so every query scans its container) and returned,
+so a change that pulls more data across the wire shows up even though there
+is no network. TimerTrigger reports 500 because no mail settings are
+configured; the report itself is still computed.
+
+Usage: python benchmarks/bench_endpoints.py [--scales 10k,100k] [--endpoints GetAnalytics,ExportToCSV]
+           [--repeat 3] [--stream-above 1m] [--json results.json]
+
+Scales of 1m and 10m are supported; datasets above --stream-above are
+replayed from the generator on every query instead of being held in memory.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; RSS is then not reported
+    resource = None
+
+DATABASE = 'coppa-db'
+CONTAINER = 'questions'
+HISTORY_DATABASE = 'db_conversation_history'
+HISTORY_CONTAINER = 'Conversations'
+DAYS = 30
+
+
+def _date(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _endpoints(now):
+    """name -> (function module, query parameters, environment overrides)"""
+    week = {'startDate': _date(now - timedelta(days=7)), 'endDate': _date(now)}
+    month = {'startDate': _date(now - timedelta(days=DAYS)), 'endDate': _date(now)}
+    return {
+        'GetAnalytics': ('GetAnalytics', week, {'ANALYTICS_ROLLUPS_ENABLED': 'false'}),
+        'GetAnalytics-rollups': ('GetAnalytics', month, {'ANALYTICS_ROLLUPS_ENABLED': 'true'}),
+        'GetAnalytics-theme': ('GetAnalytics', dict(week, theme='bail'), {}),
+        'ExportToCSV': ('ExportToCSV', {'startDate': month['startDate'][:10], 'endDate': month['endDate'][:10]}, {}),
+        'ExportToCSV-messages': ('ExportToCSV', {'startDate': month['startDate'][:10], 'endDate': month['endDate'][:10],
+                                                 'format': 'messages'}, {}),
+        'TimerTrigger': ('TimerTrigger', {}, {}),
+    }
+
+
+def parse_scale(text):
+    text = text.strip().lower()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(endpoint, documents, repeat, stream_above, results):
+    """Child process: load the dataset, call the endpoint, report the measurements."""
+    import importlib
+    import azure.functions as func
+    import fake_cosmos
+    import synthetic_data
+
+    logging.disable(logging.ERROR)
+    now = datetime.utcnow().replace(microsecond=0)
+    module_name, params, env = _endpoints(now)[endpoint]
+    os.environ.update({
+        'COSMOS_DB_ENDPOINT': 'https://benchmark.documents.azure.com',
+        'COSMOS_DB_KEY': 'benchmark',
+        'COSMOS_DB_DATABASE': DATABASE,
+        'COSMOS_DB_CONTAINER': CONTAINER,
+        'FORCE_IDENTIFIER': 'bench',
+        'ANALYTICS_CACHE_TTL_SECONDS': '0',
+        'ANALYTICS_CACHE_PAST_TTL_SECONDS': '0',
+    })
+    os.environ.update(env)
+    fake_cosmos.install()
+
+    def questions():
+        return synthetic_data.generate_documents(documents, days=DAYS, end=now)
+
+    def clicks():
+        return synthetic_data.generate_clicks(documents, days=DAYS, end=now)
+
+    client = fake_cosmos.FakeCosmosClient
+    if documents > stream_above:
+        container = client.database(DATABASE).add_container(CONTAINER, source=questions, partition_key_path='/userId')
+        history = client.database(HISTORY_DATABASE).add_container(HISTORY_CONTAINER, source=clicks,
+                                                                   partition_key_path='/userId')
+    else:
+        container = client.database(DATABASE).add_container(CONTAINER, list(questions()), partition_key_path='/userId')
+        history = client.database(HISTORY_DATABASE).add_container(HISTORY_CONTAINER, list(clicks()),
+                                                                   partition_key_path='/userId')
+    baseline_rss = _peak_rss_mb()
+
+    function = importlib.import_module(module_name)
+    req = func.HttpRequest(method='GET', url=f'http://localhost/api/{module_name}', params=params,
+                           headers={'Accept-Encoding': 'gzip'}, body=b'')
+    # Warm-up: imports, taxonomy load and, for the rollup case, building the daily rollups
+    status = function.main(req).status_code
+
+    containers = (container, history)
+    for proxy in containers:
+        proxy.reset_stats()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function.main(req)
+        latencies.append(time.perf_counter() - started)
+    peak_rss = _peak_rss_mb()
+
+    results.put({
+        'endpoint': endpoint,
+        'documents': documents,
+        'status': status,
+        'medianMs': round(statistics.median(latencies) * 1000, 1),
+        'maxMs': round(max(latencies) * 1000, 1),
+        'peakRssMb': round(peak_rss, 1) if peak_rss is not None else None,
+        'rssGrowthMb': round(peak_rss - baseline_rss, 1) if peak_rss is not None else None,
+        'scannedPerCall': sum(proxy.stats['scanned'] for proxy in containers) // repeat,
+        'returnedPerCall': sum(proxy.stats['returned'] for proxy in containers) // repeat,
+        'queriesPerCall': round(sum(proxy.stats['queries'] for proxy in containers) / repeat, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='10k,100k', help='comma-separated document counts (10k, 100k, 1m, 10m)')
+    parser.add_argument('--endpoints', default=','.join(_endpoints(datetime.utcnow())),
+                        help='comma-separated endpoints to run')
+    parser.add_argument('--repeat', type=int, default=3, help='measured calls per endpoint')
+    parser.add_argument('--stream-above', default='1m', help='replay larger datasets from the generator')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    context = multiprocessing.get_context('spawn')
+    stream_above = parse_scale(args.stream_above)
+    rows = []
+    print(f"{'endpoint':<22}{'docs':>10}{'status':>8}{'median ms':>11}{'max ms':>10}"
+          f"{'peak MB':>9}{'+MB':>8}{'scanned':>10}{'returned':>10}{'queries':>9}")
+    for scale in args.scales.split(','):
+        documents = parse_scale(scale)
+        for endpoint in args.endpoints.split(','):
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(endpoint, documents, args.repeat, stream_above, results))
+            process.start()
+            process.join()
+            if process.exitcode != 0 or results.empty():
+                print(f"{endpoint:<22}{documents:>10}  failed (exit code {process.exitcode})")
+                continue
+            row = results.get()
+            rows.append(row)
+            print(f"{row['endpoint']:<22}{row['documents']:>10}{row['status']:>8}{row['medianMs']:>11}{row['maxMs']:>10}"
+                  f"{row['peakRssMb'] or '-':>9}{row['rssGrowthMb'] or '-':>8}{row['scannedPerCall']:>10}"
+                  f"{row['returnedPerCall']:>10}{row['queriesPerCall']:>9}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Throughput of the ExportToCSV message row pipeline (row building and CSV
+formatting, without Cosmos DB or compression) on synthetic messages from
+benchmarks/synthetic_data.py, in rows per second.
+
+--enriched is the fraction of tool messages that already carry a citation
+summary; the rest have their JSON content parsed while the row is built,
+which is the CPU-heavy case.
+
+Usage: python benchmarks/bench_export_rows.py [--messages 100k] [--enriched 0,1]
+           [--repeat 3] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import parse_scale
+from synthetic_data import USERS, generate_documents
+
+
+def _messages(count, enriched):
+    # Conversation documents make up about 1 in 7 of the generated documents
+    documents = generate_documents(count * 7 // 6 + 10, enriched=enriched)
+    messages = [doc for doc in documents if doc['type'] == 'message']
+    return messages[:count]
+
+
+def _user_details():
+    return {f'user-{i:04d}': {'displayName': f'Officer {i}', 'email': f'user-{i:04d}@example.police.uk',
+                              'jobTitle': 'Police Constable', 'department': 'Response'} for i in range(USERS)}
+
+
+def run(messages, user_details, repeat):
+    import ExportToCSV
+
+    def measure(consume):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            consume()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def build():
+        for _ in ExportToCSV.message_rows(iter(messages), user_details):
+            pass
+
+    def build_and_format():
+        for _ in ExportToCSV.csv_chunks(ExportToCSV.message_rows(iter(messages), user_details)):
+            pass
+
+    # Warm-up: classifier memo
+    build()
+    rows = measure(build)
+    formatted = measure(build_and_format)
+    return {
+        'rowsPerSecond': round(len(messages) / rows),
+        'rowsPerSecondWithCsv': round(len(messages) / formatted),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', default='100k', help='messages to export (e.g. 100k, 1m)')
+    parser.add_argument('--enriched', default='0,1', help='comma-separated fractions of summarized tool messages')
+    parser.add_argument('--repeat', type=int, default=3, help='measured runs per case')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    count = parse_scale(args.messages)
+    user_details = _user_details()
+    results = []
+    print(f"{'messages':>10}{'enriched':>10}{'rows/s':>12}{'rows/s +csv':>13}")
+    for enriched in (float(value) for value in args.enriched.split(',')):
+        messages = _messages(count, enriched)
+        row = dict(messages=len(messages), enriched=enriched, **run(messages, user_details, args.repeat))
+        results.append(row)
+        print(f"{row['messages']:>10}{enriched:>10}{row['rowsPerSecond']:>12}{row['rowsPerSecondWithCsv']:>13}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
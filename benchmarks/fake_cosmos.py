@@ -0,0 +1,599 @@
+"""
+In-memory stand-in for the parts of azure-cosmos the functions use, for
+offline benchmarks. Supports the SQL subset the repo's queries are written in:
+
+- SELECT [DISTINCT] [TOP n] [VALUE] * | expressions [AS alias] FROM c
+- WHERE with AND / OR / NOT, comparisons, IN (...), the ternary operator
+  and EXISTS(SELECT VALUE t FROM t IN c.array WHERE ...)
+- IS_DEFINED, IS_NULL, IS_STRING, IS_NUMBER, CONTAINS, STARTSWITH, LOWER,
+  UPPER, ARRAY_CONTAINS and COUNT(1)
+- ORDER BY on one field, @parameters, max_item_count paging with
+  continuation tokens, and single-partition queries
+
+Undefined values follow Cosmos semantics: comparisons involving them are
+undefined, and only rows whose filter is exactly true are returned.
+Containers count the documents they scan and return, so benchmarks can
+report how much work a query pushed to the server.
+"""
+import copy
+import itertools
+import re
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+from azure.core import MatchConditions
+from azure.core.paging import ItemPaged
+from azure.cosmos import exceptions
+
+
+class _Undefined:
+    def __repr__(self):
+        return 'undefined'
+
+
+UNDEFINED = _Undefined()
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<number>\d+(?:\.\d+)?)
+    | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<param>@\w+)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<op><=|>=|!=|<>|\?\?|[=<>(),.*?:\[\]])
+    )""", re.VERBOSE)
+
+_KEYWORDS = {'SELECT', 'DISTINCT', 'TOP', 'VALUE', 'FROM', 'IN', 'WHERE', 'ORDER', 'BY', 'ASC', 'DESC',
+             'AND', 'OR', 'NOT', 'AS', 'EXISTS', 'TRUE', 'FALSE', 'NULL', 'UNDEFINED'}
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Unsupported query syntax near: {text[position:position + 30]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.upper() in _KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+def _truth(value):
+    return value is True
+
+
+def _and(left, right):
+    if left is False or right is False:
+        return False
+    if left is True and right is True:
+        return True
+    return UNDEFINED
+
+
+def _or(left, right):
+    if left is True or right is True:
+        return True
+    if left is False and right is False:
+        return False
+    return UNDEFINED
+
+
+def _comparable(left, right):
+    if left is UNDEFINED or right is UNDEFINED:
+        return False
+    if isinstance(left, bool) or isinstance(right, bool):
+        return isinstance(left, bool) and isinstance(right, bool)
+    numbers = (int, float)
+    if isinstance(left, numbers) and isinstance(right, numbers):
+        return True
+    return type(left) is type(right) and isinstance(left, (str, type(None)))
+
+
+def _compare(op, left, right):
+    if op in ('=', '!='):
+        if left is UNDEFINED or right is UNDEFINED:
+            return UNDEFINED
+        if not _comparable(left, right):
+            # Different types (or objects/arrays): equal only if identical
+            equal = left == right and type(left) is type(right)
+        else:
+            equal = left == right
+        return equal if op == '=' else not equal
+    if not _comparable(left, right) or left is None:
+        return UNDEFINED
+    if op == '<':
+        return left < right
+    if op == '<=':
+        return left <= right
+    if op == '>':
+        return left > right
+    return left >= right
+
+
+def _contains(text, fragment, ignore_case=False):
+    if not isinstance(text, str) or not isinstance(fragment, str):
+        return UNDEFINED
+    if ignore_case is True:
+        return fragment.lower() in text.lower()
+    return fragment in text
+
+
+def _startswith(text, prefix, ignore_case=False):
+    if not isinstance(text, str) or not isinstance(prefix, str):
+        return UNDEFINED
+    if ignore_case is True:
+        return text.lower().startswith(prefix.lower())
+    return text.startswith(prefix)
+
+
+_FUNCTIONS = {
+    'IS_DEFINED': lambda value: value is not UNDEFINED,
+    'IS_NULL': lambda value: value is None,
+    'IS_STRING': lambda value: isinstance(value, str),
+    'IS_NUMBER': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'LOWER': lambda value: value.lower() if isinstance(value, str) else UNDEFINED,
+    'UPPER': lambda value: value.upper() if isinstance(value, str) else UNDEFINED,
+    'CONTAINS': _contains,
+    'STARTSWITH': _startswith,
+    'ARRAY_CONTAINS': lambda array, value, partial=False: (
+        value in array if isinstance(array, list) else UNDEFINED),
+}
+
+
+class _Parser:
+    """Recursive descent parser compiling a query into Python closures."""
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def accept(self, value):
+        kind, token = self.peek()
+        if token == value and kind in ('keyword', 'op'):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value):
+        if not self.accept(value):
+            raise ValueError(f"Expected {value!r}, found {self.peek()[1]!r}")
+
+    def name(self):
+        kind, token = self.peek()
+        if kind != 'name':
+            raise ValueError(f"Expected a name, found {token!r}")
+        self.position += 1
+        return token
+
+    # SELECT ... FROM alias [IN path] [WHERE ...] [ORDER BY ...]
+    def query(self):
+        self.expect('SELECT')
+        spec = {'distinct': self.accept('DISTINCT'), 'top': None, 'value': False}
+        if self.accept('TOP'):
+            spec['top'] = self.primary()
+        spec['value'] = self.accept('VALUE')
+        if self.accept('*'):
+            spec['columns'] = None
+        else:
+            spec['columns'] = [self.column()]
+            while self.accept(','):
+                spec['columns'].append(self.column())
+        self.expect('FROM')
+        spec['alias'] = self.name()
+        spec['source'] = self.path_from(self.name()) if self.accept('IN') else None
+        spec['where'] = self.expression() if self.accept('WHERE') else None
+        spec['order'] = None
+        if self.accept('ORDER'):
+            self.expect('BY')
+            key = self.primary()
+            descending = self.accept('DESC')
+            if not descending:
+                self.accept('ASC')
+            spec['order'] = (key, descending)
+        return spec
+
+    def column(self):
+        kind, token = self.peek()
+        if kind == 'name' and token.upper() == 'COUNT' and self.peek(1)[1] == '(':
+            self.position += 2
+            self.expression()
+            self.expect(')')
+            return ('count', None, 'count')
+        expression = self.expression()
+        alias = None
+        if self.accept('AS'):
+            alias = self.name()
+        elif self.tokens[self.position - 1][0] == 'name':
+            alias = self.tokens[self.position - 1][1]
+        return ('expression', expression, alias or '$1')
+
+    def expression(self):
+        condition = self.disjunction()
+        if self.accept('?'):
+            when_true = self.expression()
+            self.expect(':')
+            when_false = self.expression()
+            return lambda env, p: when_true(env, p) if _truth(condition(env, p)) else when_false(env, p)
+        return condition
+
+    def disjunction(self):
+        left = self.conjunction()
+        while self.accept('OR'):
+            right = self.conjunction()
+            left = (lambda a, b: lambda env, p: _or(a(env, p), b(env, p)))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.accept('AND'):
+            right = self.negation()
+            left = (lambda a, b: lambda env, p: _and(a(env, p), b(env, p)))(left, right)
+        return left
+
+    def negation(self):
+        if self.accept('NOT'):
+            inner = self.negation()
+
+            def negate(env, p):
+                value = inner(env, p)
+                return (not value) if isinstance(value, bool) else UNDEFINED
+            return negate
+        return self.comparison()
+
+    def comparison(self):
+        left = self.primary()
+        kind, token = self.peek()
+        if kind == 'op' and token in ('=', '!=', '<>', '<', '<=', '>', '>='):
+            self.position += 1
+            right = self.primary()
+            op = '!=' if token == '<>' else token
+            return lambda env, p: _compare(op, left(env, p), right(env, p))
+        if self.accept('IN'):
+            self.expect('(')
+            options = [self.primary()]
+            while self.accept(','):
+                options.append(self.primary())
+            self.expect(')')
+
+            def member(env, p):
+                value = left(env, p)
+                if value is UNDEFINED:
+                    return UNDEFINED
+                return any(_compare('=', value, option(env, p)) is True for option in options)
+            return member
+        return left
+
+    def primary(self):
+        kind, token = self.peek()
+        if kind == 'number':
+            self.position += 1
+            value = float(token) if '.' in token else int(token)
+            return lambda env, p: value
+        if kind == 'string':
+            self.position += 1
+            value = token[1:-1].replace("\\'", "'").replace('\\"', '"')
+            return lambda env, p: value
+        if kind == 'param':
+            self.position += 1
+            return lambda env, p: p.get(token, UNDEFINED)
+        if kind == 'keyword' and token in ('TRUE', 'FALSE', 'NULL', 'UNDEFINED'):
+            self.position += 1
+            value = {'TRUE': True, 'FALSE': False, 'NULL': None, 'UNDEFINED': UNDEFINED}[token]
+            return lambda env, p: value
+        if kind == 'keyword' and token == 'EXISTS':
+            self.position += 1
+            self.expect('(')
+            subquery = self.query()
+            self.expect(')')
+            return lambda env, p: any(True for _ in _run(subquery, None, env, p))
+        if self.accept('('):
+            inner = self.expression()
+            self.expect(')')
+            return inner
+        if kind == 'name':
+            self.position += 1
+            if self.peek()[1] == '(':
+                function = _FUNCTIONS.get(token.upper())
+                if function is None:
+                    raise ValueError(f"Unsupported function: {token}")
+                self.position += 1
+                args = []
+                if not self.accept(')'):
+                    args.append(self.expression())
+                    while self.accept(','):
+                        args.append(self.expression())
+                    self.expect(')')
+                return lambda env, p: function(*[arg(env, p) for arg in args])
+            return self.path_from(token)
+        raise ValueError(f"Unexpected token {token!r}")
+
+    def path_from(self, root):
+        steps = []
+        while True:
+            if self.accept('.'):
+                steps.append(self.name())
+            elif self.accept('['):
+                steps.append(self.primary())
+                self.expect(']')
+            else:
+                break
+
+        def resolve(env, p):
+            value = env.get(root, UNDEFINED)
+            for step in steps:
+                key = step(env, p) if callable(step) else step
+                if isinstance(value, dict) and isinstance(key, str):
+                    value = value.get(key, UNDEFINED)
+                elif isinstance(value, list) and isinstance(key, int) and 0 <= key < len(value):
+                    value = value[key]
+                else:
+                    return UNDEFINED
+            return value
+        return resolve
+
+
+@lru_cache(maxsize=256)
+def compile_query(text):
+    parser = _Parser(text)
+    spec = parser.query()
+    if parser.position != len(parser.tokens):
+        raise ValueError(f"Unexpected trailing tokens: {parser.tokens[parser.position:]}")
+    return spec
+
+
+def _sort_key(value):
+    # Cosmos orders undefined < null < booleans < numbers < strings
+    if value is UNDEFINED:
+        return (0, 0)
+    if value is None:
+        return (1, 0)
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, 0)
+
+
+def _run(spec, documents, env, params, stats=None):
+    """Yield the rows of a compiled query over documents (or spec['source'])."""
+    alias = spec['alias']
+    if spec['source'] is not None:
+        source = spec['source'](env, params)
+        documents = source if isinstance(source, list) else []
+    where = spec['where']
+    rows = documents
+    if where is not None or stats is not None:
+        def filtered():
+            for doc in documents:
+                if stats is not None:
+                    stats['scanned'] += 1
+                if where is None or _truth(where(dict(env, **{alias: doc}), params)):
+                    yield doc
+        rows = filtered()
+
+    if spec['order'] is not None:
+        key, descending = spec['order']
+        rows = sorted(rows, key=lambda doc: _sort_key(key(dict(env, **{alias: doc}), params)), reverse=descending)
+
+    columns = spec['columns']
+    if columns and columns[0][0] == 'count':
+        yield sum(1 for _ in rows)
+        return
+
+    def project(doc):
+        if columns is None:
+            return copy.deepcopy(doc)
+        scope = dict(env, **{alias: doc})
+        if spec['value']:
+            return columns[0][1](scope, params)
+        row = {}
+        for _, expression, name in columns:
+            value = expression(scope, params)
+            if value is not UNDEFINED:
+                row[name] = value
+        return row
+
+    results = (project(doc) for doc in rows)
+    if spec['value']:
+        results = (value for value in results if value is not UNDEFINED)
+    if spec['distinct']:
+        def distinct(values):
+            seen = set()
+            for value in values:
+                marker = repr(value)
+                if marker not in seen:
+                    seen.add(marker)
+                    yield value
+        results = distinct(results)
+    if spec['top'] is not None:
+        results = itertools.islice(results, spec['top'](env, params))
+    yield from results
+
+
+class FakeContainer:
+    """
+    A container over an in-memory list of documents, or over a source: a
+    callable returning a fresh iterator of documents (e.g. a seeded
+    generator), so very large datasets never have to be held in memory.
+    Writes made through the proxy are kept in memory either way.
+    """
+
+    def __init__(self, name, documents=None, source=None, partition_key_path='/id'):
+        self.id = name
+        self.container_link = f'dbs/fake/colls/{name}'
+        self.partition_key_path = partition_key_path
+        self._documents = {}
+        self._source = source
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'scanned': 0, 'returned': 0, 'reads': 0, 'writes': 0}
+        for doc in documents or []:
+            self._store(doc)
+
+    def _store(self, doc):
+        doc = dict(doc)
+        doc['_etag'] = uuid.uuid4().hex
+        doc['_ts'] = int(time.time())
+        self._documents[(self._partition(doc), doc['id'])] = doc
+        return doc
+
+    def _partition(self, doc):
+        return doc.get(self.partition_key_path.lstrip('/'))
+
+    def _all(self):
+        if self._source is not None:
+            overridden = set(self._documents)
+            for doc in self._source():
+                if (self._partition(doc), doc.get('id')) not in overridden:
+                    yield doc
+        yield from list(self._documents.values())
+
+    def reset_stats(self):
+        for name in self.stats:
+            self.stats[name] = 0
+
+    def read(self):
+        return {'id': self.id, 'partitionKey': {'paths': [self.partition_key_path], 'kind': 'Hash'}}
+
+    def query_items(self, query, parameters=None, partition_key=None, enable_cross_partition_query=None,
+                    max_item_count=None, **kwargs):
+        spec = compile_query(query)
+        params = {param['name']: param['value'] for param in parameters or []}
+        self.stats['queries'] += 1
+        documents = self._all()
+        if partition_key is not None:
+            documents = (doc for doc in documents if self._partition(doc) == partition_key)
+        rows = _run(spec, documents, {}, params, self.stats)
+        page_size = max_item_count or 100
+        pages = {'offset': 0, 'rows': rows, 'buffer': []}
+
+        def get_next(continuation_token):
+            offset = int(continuation_token or 0)
+            if offset < pages['offset']:
+                # A token from an earlier pager: restart the query
+                pages.update(offset=0, rows=_run(spec, self._all(), {}, params, self.stats))
+            for _ in itertools.islice(pages['rows'], offset - pages['offset']):
+                pass
+            page = list(itertools.islice(pages['rows'], page_size))
+            self.stats['returned'] += len(page)
+            pages['offset'] = offset + len(page)
+            return page, (str(pages['offset']) if len(page) == page_size else None)
+
+        def extract_data(response):
+            page, token = response
+            return token, iter(page)
+
+        return ItemPaged(get_next, extract_data)
+
+    def read_item(self, item, partition_key, **kwargs):
+        self.stats['reads'] += 1
+        doc = self._documents.get((partition_key, item))
+        if doc is None and self._source is not None:
+            doc = next((d for d in self._source() if d.get('id') == item and self._partition(d) == partition_key), None)
+        if doc is None:
+            raise exceptions.CosmosResourceNotFoundError(message=f'{item} not found')
+        return copy.deepcopy(doc)
+
+    def create_item(self, body, **kwargs):
+        with self._lock:
+            if (self._partition(body), body['id']) in self._documents:
+                raise exceptions.CosmosResourceExistsError(message=f"{body['id']} exists")
+            self.stats['writes'] += 1
+            return copy.deepcopy(self._store(body))
+
+    def upsert_item(self, body, **kwargs):
+        with self._lock:
+            self.stats['writes'] += 1
+            return copy.deepcopy(self._store(body))
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        with self._lock:
+            current = self._documents.get((self._partition(body), item))
+            if current is None and self._source is None:
+                raise exceptions.CosmosResourceNotFoundError(message=f'{item} not found')
+            if (match_condition == MatchConditions.IfNotModified and current is not None
+                    and current.get('_etag') != etag):
+                raise exceptions.CosmosAccessConditionFailedError(message=f'{item} was modified')
+            self.stats['writes'] += 1
+            return copy.deepcopy(self._store(body))
+
+    def delete_item(self, item, partition_key, **kwargs):
+        with self._lock:
+            if self._documents.pop((partition_key, item), None) is None:
+                raise exceptions.CosmosResourceNotFoundError(message=f'{item} not found')
+
+
+class FakeDatabase:
+    def __init__(self, name):
+        self.id = name
+        self.containers = {}
+
+    def add_container(self, name, documents=None, source=None, partition_key_path='/id'):
+        self.containers[name] = FakeContainer(name, documents, source, partition_key_path)
+        return self.containers[name]
+
+    def get_container_client(self, name):
+        if name not in self.containers:
+            self.add_container(name)
+        return self.containers[name]
+
+    def create_container_if_not_exists(self, id, partition_key=None, **kwargs):
+        if id not in self.containers:
+            path = partition_key['paths'][0] if partition_key else '/id'
+            self.add_container(id, partition_key_path=path)
+        return self.containers[id]
+
+
+class FakeCosmosClient:
+    """
+    Drop-in for azure.cosmos.CosmosClient. Databases live on the class, so
+    every client created by shared_code.cosmos_pool sees the same data.
+    """
+    databases = {}
+
+    def __init__(self, url=None, credential=None, **kwargs):
+        pass
+
+    @classmethod
+    def database(cls, name):
+        if name not in cls.databases:
+            cls.databases[name] = FakeDatabase(name)
+        return cls.databases[name]
+
+    @classmethod
+    def reset(cls):
+        cls.databases = {}
+
+    def get_database_client(self, name):
+        return self.database(name)
+
+    def create_database_if_not_exists(self, id, **kwargs):
+        return self.database(id)
+
+
+def install():
+    """
+    Route shared_code.cosmos_pool (and any later azure.cosmos.CosmosClient
+    import) to the fake, and drop the cached proxies.
+    """
+    import azure.cosmos
+    from shared_code import cosmos_pool, partition_routing, rollups
+    azure.cosmos.CosmosClient = FakeCosmosClient
+    cosmos_pool.CosmosClient = FakeCosmosClient
+    cosmos_pool._clients.clear()
+    cosmos_pool._databases.clear()
+    cosmos_pool._containers.clear()
+    rollups._rollup_containers.clear()
+    partition_routing._partition_paths.clear()
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the Microsoft Graph JSON $batch endpoint, for exercising
+shared_code/graph_users.py without a tenant.
+
+Users named user-NNNN (as produced by benchmarks/synthetic_data.py) exist;
+anything else returns 404. Each call can be delayed (--latency-ms) and a
+fraction of the batch entries throttled with 429 and a Retry-After
+(--throttle), and the same for whole batch calls (--throttle-batches).
+
+Usage: python benchmarks/mock_graph.py [--users 2000] [--latency-ms 150] [--throttle 0.05]
+           [--concurrency 4] [--serve]
+
+Without --serve, looks up --users users through the server and prints the
+call count and elapsed time; with --serve it keeps running so the
+functions host can use it via GRAPH_API_URL=http://127.0.0.1:<port>/v1.0.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+_USER_URL = re.compile(r'^/users/([^?/]+)')
+_KNOWN_USER = re.compile(r'^user-\d{4}$')
+
+
+class MockGraph(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, throttle=0.0, throttle_batches=0.0,
+                 retry_after=1, seed=1):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.throttle = throttle
+        self.throttle_batches = throttle_batches
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'requests': 0, 'throttled': 0}
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1.0"
+
+    def roll(self, probability):
+        with self._lock:
+            return self._rng.random() < probability
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        server.count('calls')
+        if server.latency:
+            time.sleep(server.latency)
+        if not self.path.endswith('/$batch'):
+            return self._send(404, {'error': {'code': 'NotFound'}})
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._send(401, {'error': {'code': 'InvalidAuthenticationToken'}})
+        requests = body.get('requests', [])
+        if len(requests) > 20:
+            return self._send(400, {'error': {'code': 'BadRequest', 'message': 'Too many requests in batch'}})
+        if server.throttle_batches and server.roll(server.throttle_batches):
+            server.count('throttled', len(requests))
+            return self._send(429, {'error': {'code': 'TooManyRequests'}}, {'Retry-After': str(server.retry_after)})
+        server.count('requests', len(requests))
+        responses = []
+        for entry in requests:
+            match = _USER_URL.match(entry.get('url', ''))
+            user_id = match.group(1) if match else ''
+            if server.throttle and server.roll(server.throttle):
+                server.count('throttled')
+                responses.append({'id': entry['id'], 'status': 429, 'headers': {'Retry-After': str(server.retry_after)},
+                                  'body': {'error': {'code': 'TooManyRequests'}}})
+            elif _KNOWN_USER.match(user_id):
+                number = int(user_id[5:])
+                responses.append({'id': entry['id'], 'status': 200, 'body': {
+                    'id': user_id, 'displayName': f'Officer {number}', 'userPrincipalName': f'{user_id}@example.police.uk',
+                    'jobTitle': 'Police Constable', 'department': f'Response Team {number % 12}'}})
+            else:
+                responses.append({'id': entry['id'], 'status': 404, 'body': {'error': {'code': 'Request_ResourceNotFound'}}})
+        self._send(200, {'responses': responses})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000, help='users to look up')
+    parser.add_argument('--latency-ms', type=float, default=150, help='delay per Graph call')
+    parser.add_argument('--throttle', type=float, default=0.0, help='fraction of batch entries answered with 429')
+    parser.add_argument('--throttle-batches', type=float, default=0.0, help='fraction of batch calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--concurrency', type=int, default=4, help='batches in flight')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--serve', action='store_true', help='keep serving instead of running a lookup')
+    args = parser.parse_args()
+
+    server = MockGraph(('127.0.0.1', args.port), latency=args.latency_ms / 1000, throttle=args.throttle,
+                       throttle_batches=args.throttle_batches, retry_after=args.retry_after).start()
+    if args.serve:
+        print(f"Mock Graph listening on {server.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    from shared_code.graph_users import get_user_details
+    user_ids = [f'user-{i:04d}' for i in range(args.users - 1)] + ['not-a-user']
+    started = time.perf_counter()
+    details = get_user_details(user_ids, 'mock-token', base_url=server.url, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - started
+    unknown = sum(1 for entry in details.values() if entry['displayName'] == 'Unknown')
+    print(f"{len(details)} users ({unknown} unknown) in {elapsed * 1000:.0f} ms: {server.stats['calls']} calls, "
+          f"{server.stats['throttled']} throttled")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
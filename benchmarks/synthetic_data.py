@@ -0,0 +1,155 @@
+"""
+Deterministic synthetic data shaped like the production containers:
+conversations with user/tool/assistant messages (tool messages carry citation
+JSON) in the questions container, and citation click events in the
+conversation history container.
+
+Documents are generated lazily from a seed, so the same dataset can be
+replayed at any scale without keeping it in memory.
+
+Usage: python benchmarks/synthetic_data.py [documents]   (prints a sample)
+"""
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared_code.citation_summary import SUMMARY_FIELD, build_citation_summary
+
+TITLE_TEMPLATES = [
+    'Bail conditions after arrest for {}', 'Stalking protection order guidance for {}',
+    'Domestic abuse risk assessment involving {}', 'Missing child report procedure for {}',
+    'Custody review timings for {}', 'Noise complaint powers about {}', 'Theft from vehicle investigation at {}',
+    'Mental health detention s136 and {}', 'Warrant execution for {}', 'Safeguarding referral for {}',
+    'Traffic collision report near {}', 'Lost property enquiry about {}', 'Drugs search powers for {}',
+    'Licensing visit at {}', 'Anti-social behaviour closure order for {}',
+]
+SUBJECTS = [
+    'a juvenile', 'a vulnerable adult', 'a retail premises', 'a railway station', 'a repeat victim',
+    'a night-time economy venue', 'a school', 'a care home', 'a foreign national', 'a licensed premises',
+]
+CITATION_TITLES = [
+    'cop-app-detention-and-custody.pdf', 'College of Policing - APP: Stalking or harassment',
+    'npcc-gravity-matrix-2023.pdf', 'legislation.gov.uk - Bail Act 1976 s3', 'govuk-cps-charging-standard.pdf',
+    'govuk-ho-notifiable-offence-list.pdf', 'Sentencing Council guidelines - theft', 'pace-code-c-2019.pdf',
+    'BTP-Policy-Lost-Property.docx', 'Local force intranet guidance note', 'Mental Health Act 1983 s136',
+    'cps-domestic-abuse-guidance.pdf', 'Home Office counting rules', 'Victims Code 2020',
+]
+ANSWER_WORDS = (
+    'officers should consider the relevant guidance and record their rationale including any '
+    'risk factors safeguarding measures and supervisory review before deciding on further action'
+).split()
+
+USERS = 400
+# Each conversation has a conversation document and 1-3 question/tool/answer turns
+AVERAGE_DOCUMENTS_PER_CONVERSATION = 7
+CLICK_RATE = 0.12
+
+
+def _timestamp(rng, dt):
+    """Mix of the timestamp forms stored in production."""
+    form = rng.random()
+    if form < 0.6:
+        return dt.isoformat(timespec='microseconds')
+    if form < 0.9:
+        return dt.strftime('%Y-%m-%dT%H:%M:%S.%f') + '0Z'
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _answer(rng, words):
+    return ' '.join(rng.choice(ANSWER_WORDS) for _ in range(words))
+
+
+def _conversation(rng, index, created, enriched):
+    """The documents of one conversation, in write order."""
+    conversation_id = f'conv-{index:08d}'
+    user_id = f'user-{rng.randrange(USERS):04d}'
+    title = rng.choice(TITLE_TEMPLATES).format(rng.choice(SUBJECTS))
+    docs = [{
+        'id': conversation_id,
+        'type': 'conversation',
+        'title': title,
+        'userId': user_id,
+        'createdAt': _timestamp(rng, created),
+        'updatedAt': _timestamp(rng, created),
+    }]
+    moment = created
+    for turn in range(rng.randint(1, 3)):
+        moment += timedelta(seconds=rng.randint(5, 120))
+        docs.append({
+            'id': f'{conversation_id}-q{turn}', 'type': 'message', 'role': 'user',
+            'conversationId': conversation_id, 'userId': user_id,
+            'content': title if turn == 0 else _answer(rng, 12), 'createdAt': _timestamp(rng, moment),
+        })
+        moment += timedelta(seconds=rng.randint(2, 30))
+        citations = [
+            {'title': rng.choice(CITATION_TITLES), 'url': 'https://example.police.uk/doc/' + str(rng.randrange(10000)),
+             'content': _answer(rng, rng.randint(40, 160))}
+            for _ in range(rng.randint(0, 6))
+        ]
+        tool = {
+            'id': f'{conversation_id}-t{turn}', 'type': 'message', 'role': 'tool',
+            'conversationId': conversation_id, 'userId': user_id,
+            'content': json.dumps({'citations': citations, 'intent': title}), 'createdAt': _timestamp(rng, moment),
+        }
+        if enriched and rng.random() < enriched:
+            tool[SUMMARY_FIELD] = build_citation_summary(tool['content'])
+        docs.append(tool)
+        moment += timedelta(seconds=rng.randint(1, 10))
+        docs.append({
+            'id': f'{conversation_id}-a{turn}', 'type': 'message', 'role': 'assistant',
+            'conversationId': conversation_id, 'userId': user_id,
+            'content': _answer(rng, rng.randint(60, 240)), 'createdAt': _timestamp(rng, moment),
+        })
+    return docs
+
+
+def generate_documents(documents, seed=1, days=30, end=None, enriched=0.0):
+    """
+    Yield about `documents` questions-container documents for conversations
+    spread evenly over the `days` before `end` (default now, UTC). enriched
+    is the fraction of tool messages that already carry a citation summary.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.utcnow()
+    conversations = max(1, documents // AVERAGE_DOCUMENTS_PER_CONVERSATION)
+    span = days * 24 * 60 * 60
+    produced = 0
+    for index in range(conversations):
+        created = end - timedelta(seconds=span * (conversations - index) / conversations)
+        for doc in _conversation(rng, index, created, enriched):
+            yield doc
+            produced += 1
+            if produced >= documents:
+                return
+
+
+def generate_clicks(documents, seed=1, days=30, end=None):
+    """Citation click events for about CLICK_RATE of the conversations."""
+    rng = random.Random(seed + 1)
+    end = end or datetime.utcnow()
+    conversations = max(1, documents // AVERAGE_DOCUMENTS_PER_CONVERSATION)
+    span = days * 24 * 60 * 60
+    for index in range(conversations):
+        if rng.random() >= CLICK_RATE:
+            continue
+        created = end - timedelta(seconds=span * (conversations - index) / conversations - 300)
+        yield {
+            'id': f'click-{index:08d}', 'type': 'citation_click', 'conversationId': f'conv-{index:08d}',
+            'citationTitle': rng.choice(CITATION_TITLES), 'citationUrl': '',
+            'userId': f'user-{rng.randrange(USERS):04d}', 'createdAt': _timestamp(rng, created),
+        }
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for doc in generate_documents(documents):
+        print(json.dumps(doc)[:200])
+    print(f"{sum(1 for _ in generate_clicks(documents))} clicks")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# This file marks the folder as a Python package for Azure Functions
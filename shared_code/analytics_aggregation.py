@@ -0,0 +1,418 @@
+import heapq
+import logging
+from collections import Counter, defaultdict
+
+from shared_code.citation_classifier import OTHER_SOURCE, classify_citation
+from shared_code.citation_summary import citation_summary
+from shared_code.theme_taxonomy import get_theme_matcher
+from shared_code.timestamps import document_epoch, hour_of
+
+RECENT_QUESTIONS_LIMIT = 20
+# The summary payload lists at most this many conversation themes; the
+# questions behind each theme are paged by GetAnalyticsDrilldown
+THEMES_BREAKDOWN_LIMIT = 50
+UNMATCHED_SAMPLES_LIMIT = 20
+RETURNING_USER_SECONDS = 24 * 60 * 60
+
+
+def empty_state():
+    """
+    Mergeable analytics state. Everything in here is JSON-serializable so it
+    can be stored as-is in a daily rollup document.
+    """
+    return {
+        "totalInteractions": 0,
+        "totalQuestions": 0,
+        "totalUserQuestions": 0,
+        "users": {},  # userId -> [first seen epoch, last seen epoch]
+        "categories": {},
+        "themes": {},
+        "conversationThemes": {},
+        "conversationTitles": {},
+        "hourly": [0] * 24,
+        "recentQuestions": [],
+        "responseTimeTotal": 0.0,
+        "responseTimeCount": 0,
+        "citationSources": {},  # source -> {"count": n, "conversations": [ids]}
+        "unmatchedSamples": [],
+        "conversationsWithCitations": [],
+        "conversationsWithResponses": [],
+        "conversationsWithClicks": [],
+        "totalCitationClicks": 0,
+        "messageCounts": {},  # conversationId -> messages
+        "userConversationCounts": {},  # userId -> conversations
+    }
+
+
+class AnalyticsAccumulator:
+    """
+    Single-pass fold over analytics documents. Feed it documents straight from
+    the query pager with add(); nothing keeps a reference to the documents, so
+    memory grows with distinct conversations and users, not with documents.
+    Titles are matched against theme_matcher, by default the current taxonomy.
+    With timings (a shared_code.timing.Timings), the time spent reading
+    citations is reported as the "citations" stage.
+    """
+
+    def __init__(self, theme_matcher=None, timings=None):
+        self.theme_matcher = theme_matcher or get_theme_matcher()
+        self.timings = timings
+        self.total_interactions = 0
+        self.total_user_questions = 0
+        self.users = {}  # userId -> [first seen epoch, last seen epoch]
+        self.categories = Counter()
+        self.themes = Counter()
+        self.conversation_themes = Counter()
+        self.conversation_titles = Counter()
+        self.hourly_distribution = [0]*24
+        # Question entries wait for the whole pass so their first response is known
+        self.questions = []
+        self.question_epochs = []  # createdAt epoch per entry in self.questions
+        self.first_response = {}  # conversationId -> earliest tool response epoch
+        self.citation_sources = defaultdict(lambda: {'count': 0, 'questions': set()})
+        self.total_citations_processed = 0
+        self.unmatched_samples = []  # Store sample unmatched citations for debugging
+        self.citation_clicks = set()  # Track unique conversations with citation clicks
+        self.total_citation_clicks = 0
+        self.conversations_with_citations = set()
+        self.conversations_with_responses = set()
+        self.conversation_message_counts = defaultdict(int)
+        self.user_conversation_count = defaultdict(int)
+
+    def add(self, item):
+        self.total_interactions += 1
+        item_type = item.get('type')
+        role = item.get('role')
+        conv_id = item.get('conversationId')
+        user_id = item.get('userId')
+        # createdAt (or timestamp) is parsed once here and reused below
+        epoch = document_epoch(item)
+
+        if role == 'user':
+            self.total_user_questions += 1
+
+        # Track citation clicks
+        if item_type == 'citation_click' and conv_id:
+            self.citation_clicks.add(conv_id)
+            self.total_citation_clicks += 1
+
+        # Track conversation message counts and the responses for response times
+        if item_type == 'message' and conv_id:
+            self.conversation_message_counts[conv_id] += 1
+            if role == 'tool' and epoch is not None:
+                first = self.first_response.get(conv_id)
+                if first is None or epoch < first:
+                    self.first_response[conv_id] = epoch
+
+        # Track first/last activity per user (for unique and returning users)
+        if user_id:
+            seen = self.users.setdefault(user_id, [None, None])
+            if epoch is not None:
+                if seen[0] is None or epoch < seen[0]:
+                    seen[0] = epoch
+                if seen[1] is None or epoch > seen[1]:
+                    seen[1] = epoch
+
+        # Category
+        cat = item.get('category') or item_type
+        if cat:
+            self.categories[cat] += 1
+
+        # Hourly distribution
+        if epoch is not None:
+            self.hourly_distribution[hour_of(epoch)] += 1
+
+        # Extract citations from tool messages
+        if role == 'tool':
+            self._add_citations(item, conv_id)
+
+        if item_type == 'conversation':
+            self._add_conversation(item, user_id, cat, epoch)
+
+    def _add_citations(self, item, conv_id):
+        if conv_id:
+            self.conversations_with_responses.add(conv_id)
+        if self.timings is not None:
+            with self.timings.stage('citations'):
+                citations = citation_summary(item)['citations']
+        else:
+            citations = citation_summary(item)['citations']
+        if not citations:
+            return
+        # Track conversations that have citations
+        if conv_id:
+            self.conversations_with_citations.add(conv_id)
+
+        for citation in citations:
+            title = citation['title'].lower()
+            # Log first 50 citation titles for debugging to understand patterns
+            if self.total_citations_processed < 50:
+                logging.info(f"Citation title: {title}")
+
+            # Categorize citation by source
+            source_name = classify_citation(title)
+            self.citation_sources[source_name]['count'] += 1
+            if conv_id:
+                self.citation_sources[source_name]['questions'].add(conv_id)
+            # If no category matched, categorize as "Other Documents"
+            if source_name == OTHER_SOURCE:
+                # Log unmatched citations to help identify new patterns
+                if self.total_citations_processed < 50:
+                    logging.warning(f"Unmatched citation: {title}")
+                # Store first 20 unmatched samples for API response
+                if len(self.unmatched_samples) < UNMATCHED_SAMPLES_LIMIT:
+                    self.unmatched_samples.append(title)
+
+            self.total_citations_processed += 1
+
+    def _add_conversation(self, item, user_id, cat, epoch):
+        # Count conversations per user
+        if user_id:
+            self.user_conversation_count[user_id] += 1
+
+        # Conversation title breakdown (AI-generated overviews, filtered period)
+        title = (item.get('title') or '').strip()
+        if title:
+            self.conversation_titles[title] += 1
+        title_themes = list(self.theme_matcher.match(title))
+
+        # Conversation themes breakdown: stored themes, else keywords from the title
+        for theme in item.get('themes', []) or title_themes:
+            self.conversation_themes[theme] += 1
+
+        # Questions (user questions)
+        if item.get('title') or item.get('question'):
+            for theme in title_themes:
+                self.themes[theme] += 1
+            self.questions.append(question_entry(item, cat, title_themes))
+            self.question_epochs.append(epoch)
+
+    def _response_time(self, question, question_epoch):
+        """Seconds from the question to its first AI response, if known."""
+        first = self.first_response.get(question['id'])
+        if first is None or question_epoch is None:
+            return None
+        delta = first - question_epoch
+        if delta >= 0:
+            return delta
+        return None
+
+    def state(self):
+        """The mergeable state for everything added so far."""
+        response_time_total = 0.0
+        response_time_count = 0
+        for question, question_epoch in zip(self.questions, self.question_epochs):
+            resp_time = self._response_time(question, question_epoch)
+            question['responseTimeSeconds'] = resp_time
+            if resp_time is not None:
+                response_time_total += resp_time
+                response_time_count += 1
+
+        state = empty_state()
+        state['totalInteractions'] = self.total_interactions
+        state['totalQuestions'] = len(self.questions)
+        state['totalUserQuestions'] = self.total_user_questions
+        state['users'] = self.users
+        state['categories'] = dict(self.categories)
+        state['themes'] = dict(self.themes)
+        state['conversationThemes'] = dict(self.conversation_themes)
+        state['conversationTitles'] = dict(self.conversation_titles)
+        state['hourly'] = self.hourly_distribution
+        # Most recent questions by createdAt desc
+        state['recentQuestions'] = heapq.nlargest(
+            RECENT_QUESTIONS_LIMIT, self.questions, key=lambda x: x.get('createdAt') or '')
+        state['responseTimeTotal'] = response_time_total
+        state['responseTimeCount'] = response_time_count
+        state['citationSources'] = {
+            source_name: {'count': data['count'], 'conversations': sorted(data['questions'])}
+            for source_name, data in self.citation_sources.items()
+        }
+        state['unmatchedSamples'] = self.unmatched_samples
+        state['conversationsWithCitations'] = sorted(self.conversations_with_citations)
+        state['conversationsWithResponses'] = sorted(self.conversations_with_responses)
+        state['conversationsWithClicks'] = sorted(self.citation_clicks)
+        state['totalCitationClicks'] = self.total_citation_clicks
+        state['messageCounts'] = dict(self.conversation_message_counts)
+        state['userConversationCounts'] = dict(self.user_conversation_count)
+        return state
+
+
+def question_entry(item, category, themes):
+    """The question record listed for a conversation document."""
+    return {
+        'title': item.get('title') or item.get('question'),
+        'category': category,
+        'userId': item.get('userId'),
+        'createdAt': item.get('createdAt'),
+        'updatedAt': item.get('updatedAt'),
+        'type': item.get('type'),
+        'id': item.get('id'),
+        'themes': themes,
+        'responseTimeSeconds': None,
+    }
+
+
+def aggregate_items(items):
+    """
+    Aggregate an iterable of already-filtered documents into a mergeable state.
+    """
+    accumulator = AnalyticsAccumulator()
+    for item in items:
+        accumulator.add(item)
+    return accumulator.state()
+
+
+def merge_states(states):
+    """
+    Merge several aggregation states (e.g. daily rollups plus a live partial
+    day) into one. Counters add up, id sets are unioned and the bounded lists
+    are re-trimmed.
+    """
+    merged = empty_state()
+    counters = ('categories', 'themes', 'conversationThemes', 'conversationTitles',
+                'messageCounts', 'userConversationCounts')
+    id_sets = ('conversationsWithCitations', 'conversationsWithResponses', 'conversationsWithClicks')
+    merged_counters = {name: Counter() for name in counters}
+    merged_sets = {name: set() for name in id_sets}
+    citation_sources = defaultdict(lambda: {'count': 0, 'conversations': set()})
+    recent_questions = []
+
+    for state in states:
+        if not state:
+            continue
+        for name in ('totalInteractions', 'totalQuestions', 'totalUserQuestions',
+                     'responseTimeTotal', 'responseTimeCount', 'totalCitationClicks'):
+            merged[name] += state.get(name, 0)
+        for name in counters:
+            merged_counters[name].update(state.get(name, {}))
+        for name in id_sets:
+            merged_sets[name].update(state.get(name, []))
+        for hour, count in enumerate(state.get('hourly', [])):
+            merged['hourly'][hour] += count
+        for user_id, (first, last) in state.get('users', {}).items():
+            seen = merged['users'].setdefault(user_id, [None, None])
+            if first is not None and (seen[0] is None or first < seen[0]):
+                seen[0] = first
+            if last is not None and (seen[1] is None or last > seen[1]):
+                seen[1] = last
+        for source_name, data in state.get('citationSources', {}).items():
+            citation_sources[source_name]['count'] += data.get('count', 0)
+            citation_sources[source_name]['conversations'].update(data.get('conversations', []))
+        for sample in state.get('unmatchedSamples', []):
+            if len(merged['unmatchedSamples']) < UNMATCHED_SAMPLES_LIMIT:
+                merged['unmatchedSamples'].append(sample)
+        recent_questions.extend(state.get('recentQuestions', []))
+
+    for name in counters:
+        merged[name] = dict(merged_counters[name])
+    for name in id_sets:
+        merged[name] = sorted(merged_sets[name])
+    merged['citationSources'] = {
+        source_name: {'count': data['count'], 'conversations': sorted(data['conversations'])}
+        for source_name, data in citation_sources.items()
+    }
+    merged['recentQuestions'] = sorted(recent_questions, key=lambda x: x.get('createdAt') or '', reverse=True)[:RECENT_QUESTIONS_LIMIT]
+    return merged
+
+
+def build_analytics_payload(state, all_time_totals):
+    """
+    Turn an aggregation state into the GetAnalytics response body.
+    """
+    unique_users = state['users']
+    returning_users = [
+        user_id for user_id, (first, last) in unique_users.items()
+        if first is not None and last is not None and last - first >= RETURNING_USER_SECONDS
+    ]
+    hourly_distribution = state['hourly']
+    conversation_message_counts = state['messageCounts']
+    user_conversation_count = state['userConversationCounts']
+    citation_sources = state['citationSources']
+
+    conversation_title_breakdown = [
+        {"title": title, "count": count}
+        for title, count in Counter(state['conversationTitles']).most_common(10)
+    ]
+    conversation_themes_breakdown = [
+        {"theme": theme, "count": count}
+        for theme, count in Counter(state['conversationThemes']).most_common(THEMES_BREAKDOWN_LIMIT)
+    ]
+
+    # Top themes (by category/type)
+    top_themes = [{'theme': k, 'count': v} for k, v in Counter(state['themes']).most_common(5)]
+
+    # Peak usage hour
+    peak_hour = hourly_distribution.index(max(hourly_distribution)) if any(hourly_distribution) else None
+
+    # Calculate additional metrics
+    avg_response_time = round(state['responseTimeTotal']/state['responseTimeCount'], 2) if state['responseTimeCount'] else None
+
+    # Citation engagement metrics
+    conversations_with_citations_count = len(state['conversationsWithCitations'])
+    conversations_with_clicks_count = len(state['conversationsWithClicks'])
+    citation_engagement_rate = round((conversations_with_clicks_count / conversations_with_citations_count * 100), 1) if conversations_with_citations_count > 0 else 0
+
+    # Conversation length metrics
+    avg_messages_per_conversation = round(sum(conversation_message_counts.values()) / len(conversation_message_counts), 1) if conversation_message_counts else 0
+
+    # User engagement metrics
+    avg_conversations_per_user = round(sum(user_conversation_count.values()) / len(user_conversation_count), 1) if user_conversation_count else 0
+    returning_user_rate = round((len(returning_users) / len(unique_users) * 100), 1) if len(unique_users) > 0 else 0
+
+    # Response quality metrics
+    conversations_with_responses = state['conversationsWithResponses']
+    responses_with_citations_rate = round((conversations_with_citations_count / len(conversations_with_responses) * 100), 1) if conversations_with_responses else 0
+
+    # Format citations data for response
+    total_citations = sum(data['count'] for data in citation_sources.values())
+    citations_breakdown = [
+        {
+            "source": source_name,
+            "totalCitations": data['count'],
+            "questionsCount": len(data['conversations']),
+            "percentage": round((data['count'] / total_citations * 100), 1) if total_citations > 0 else 0,
+            "avgPerQuestion": round(data['count'] / len(data['conversations']), 1) if len(data['conversations']) > 0 else 0
+        }
+        for source_name, data in sorted(citation_sources.items(), key=lambda x: x[1]['count'], reverse=True)
+    ]
+
+    return {
+        "summary": {
+            "totalInteractions": state['totalInteractions'],
+            "uniqueUsers": len(unique_users),
+            "totalQuestions": state['totalQuestions'],
+            "totalUserQuestions": state['totalUserQuestions'],
+            "peakUsageHour": peak_hour,
+            "avgResponseTimeSeconds": avg_response_time,
+            "avgMessagesPerConversation": avg_messages_per_conversation,
+            "avgConversationsPerUser": avg_conversations_per_user,
+            "returningUserRate": returning_user_rate
+        },
+        "categories": {k: {"count": v} for k, v in state['categories'].items()},
+        "themes": {"top_themes": top_themes},
+        "conversationThemesBreakdown": conversation_themes_breakdown,
+        "conversationTitleBreakdown": conversation_title_breakdown,
+        "trends": {"hourly_distribution": hourly_distribution},
+        "questions": {"recent": state['recentQuestions']},
+        "citations": {
+            "breakdown": citations_breakdown,
+            "totalCitations": sum(c['totalCitations'] for c in citations_breakdown),
+            "totalQuestionsWithCitations": len(set().union(*[data['conversations'] for data in citation_sources.values()])) if citation_sources else 0,
+            "unmatchedSamples": state['unmatchedSamples'],  # Debug: show sample unmatched citations
+            "conversationsWithCitations": conversations_with_citations_count,
+            "conversationsWithClicks": conversations_with_clicks_count,
+            "citationEngagementRate": citation_engagement_rate,
+            "totalCitationClicks": state['totalCitationClicks'],
+            "responsesWithCitationsRate": responses_with_citations_rate
+        },
+        # --- Engagement metrics ---
+        "engagement": {
+            "avgMessagesPerConversation": avg_messages_per_conversation,
+            "avgConversationsPerUser": avg_conversations_per_user,
+            "returningUserRate": returning_user_rate,
+            "totalReturningUsers": len(returning_users),
+            "citationCheckRate": citation_engagement_rate
+        },
+        # --- NEW FIELD: allTime ---
+        "allTime": all_time_totals
+    }
@@ -0,0 +1,231 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from shared_code.citation_summary import SUMMARY_FIELD, SUMMARY_VERSION
+from shared_code.timestamps import document_epoch, to_epoch
+
+# Fields the analytics aggregation actually reads. Anything else on the
+# document (full message bodies, citation payloads on non-tool messages, system
+# properties) is left on the server.
+ANALYTICS_FIELDS = (
+    'id', 'type', 'role', 'category', 'title', 'question', 'themes',
+    'userId', 'createdAt', 'timestamp', 'updatedAt', 'conversationId',
+)
+
+# Fields of the citation click events in the conversation history container
+CLICK_FIELDS = ('id', 'type', 'category', 'conversationId', 'userId', 'createdAt', 'timestamp')
+
+# Fields of the conversation documents listed by the drill-down endpoints
+QUESTION_FIELDS = ('id', 'type', 'category', 'title', 'question', 'themes',
+                   'userId', 'createdAt', 'timestamp', 'updatedAt')
+
+# Fields written by ExportToCSV, per format. Conversation exports also read
+# the messages, but only to count them per conversation.
+CONVERSATION_EXPORT_FIELDS = ('id', 'type', 'title', 'category', 'userId', 'createdAt', 'timestamp',
+                              'updatedAt', 'themes', 'conversationId')
+MESSAGE_EXPORT_FIELDS = ('id', 'conversationId', 'type', 'role', 'content', 'userId', 'createdAt', 'timestamp')
+
+# Secondary reads run beside the primary query on these threads
+_fetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analytics-fetch')
+
+
+def _projection(fields, tool_content=True):
+    """
+    Build the SELECT list for a projection. Tool messages contribute their
+    citation summary; the large content field is only returned for tool
+    messages without a current one (not yet enriched or backfilled). When
+    fields include 'content', other messages keep theirs.
+    """
+    if not fields:
+        return "*"
+    columns = [f"c.{field}" for field in fields if not (tool_content and field == 'content')]
+    if tool_content:
+        columns.append(f"c.{SUMMARY_FIELD}")
+        stale = f"(NOT IS_DEFINED(c.{SUMMARY_FIELD}) OR c.{SUMMARY_FIELD}.version != {SUMMARY_VERSION})"
+        if 'content' in fields:
+            columns.append(f"(c.role = 'tool' AND NOT {stale} ? undefined : c.content) AS content")
+        else:
+            columns.append(f"(c.role = 'tool' AND {stale} ? c.content : undefined) AS content")
+    return ", ".join(columns)
+
+
+def _day_bounds(start_dt, end_dt):
+    """
+    Coarse lexicographic bounds for ISO timestamp strings.
+    Stored timestamps mix naive, 'Z' and offset forms, so the window is widened
+    by a day on each side and the exact comparison is left to the caller.
+    """
+    lower = (start_dt - timedelta(days=1)).strftime('%Y-%m-%d')
+    upper = (end_dt + timedelta(days=2)).strftime('%Y-%m-%d')
+    return lower, upper
+
+
+def item_in_range(item, start_dt, end_dt):
+    """
+    Exact date check applied after the coarse query bounds. start_dt and end_dt
+    are naive UTC; document timestamps are normalized to UTC (naive ones are
+    taken as UTC) and parsed only once per document.
+    """
+    epoch = document_epoch(item)
+    if epoch is None:
+        return False
+    return to_epoch(start_dt) <= epoch <= to_epoch(end_dt)
+
+
+def build_analytics_query(start_dt=None, end_dt=None, category=None, theme=None,
+                          types=None, roles=None, fields=ANALYTICS_FIELDS, tool_content=True,
+                          order_by=None, select=None, theme_keywords=None):
+    """
+    Build a parameterized Cosmos DB query for the analytics functions.
+    Returns a (query, parameters) tuple for container.query_items().
+
+    - start_dt/end_dt: date window on createdAt (falling back to timestamp)
+    - category: matches category, or type when the document has no category
+    - theme: case-insensitive substring of the title or of any entry in themes;
+      theme_keywords (the theme's taxonomy keywords) replace the label for the
+      title match
+    - types/roles: restrict to the given document types / message roles
+    - fields: projection; pass None for SELECT *
+    - tool_content: also project citation data for tool messages
+    - order_by: field to sort on, newest first (e.g. 'createdAt'); documents
+      without the field sort last, with no timestamp fallback
+    - select: raw SELECT list replacing the projection (e.g. 'DISTINCT VALUE c.userId')
+
+    The predicates are a superset of the Python filters in GetAnalytics, which
+    still apply the exact (timezone-aware) comparison afterwards.
+    """
+    clauses = []
+    parameters = []
+
+    if start_dt and end_dt:
+        lower, upper = _day_bounds(start_dt, end_dt)
+        clauses.append(
+            "((c.createdAt >= @start AND c.createdAt < @end) OR "
+            "(c.timestamp >= @start AND c.timestamp < @end))"
+        )
+        parameters.append({"name": "@start", "value": lower})
+        parameters.append({"name": "@end", "value": upper})
+
+    if types:
+        names = []
+        for i, value in enumerate(types):
+            names.append(f"@type{i}")
+            parameters.append({"name": f"@type{i}", "value": value})
+        clauses.append(f"c.type IN ({', '.join(names)})")
+
+    if roles:
+        names = []
+        for i, value in enumerate(roles):
+            names.append(f"@role{i}")
+            parameters.append({"name": f"@role{i}", "value": value})
+        clauses.append(f"c.role IN ({', '.join(names)})")
+
+    if theme:
+        title_clauses = []
+        for i, keyword in enumerate(theme_keywords or [theme]):
+            title_clauses.append(f"CONTAINS(c.title, @themeKeyword{i}, true)")
+            parameters.append({"name": f"@themeKeyword{i}", "value": keyword})
+        clauses.append(
+            f"({' OR '.join(title_clauses)} OR "
+            "EXISTS(SELECT VALUE t FROM t IN c.themes WHERE CONTAINS(t, @theme, true)))"
+        )
+        parameters.append({"name": "@theme", "value": theme})
+    elif category:
+        clauses.append(
+            "(c.category = @category OR "
+            "((NOT IS_DEFINED(c.category) OR IS_NULL(c.category) OR c.category = '') AND c.type = @category))"
+        )
+        parameters.append({"name": "@category", "value": category})
+
+    query = f"SELECT {select or _projection(fields, tool_content)} FROM c"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    if order_by:
+        query += f" ORDER BY c.{order_by} DESC"
+    logging.info(f"Analytics query: {query}")
+    return query, parameters
+
+
+def fetch_citation_clicks(container, start_dt=None, end_dt=None, category=None, response_hook=None):
+    """
+    Citation click events in [start_dt, end_dt]. The type filter, date bounds
+    and projection are pushed down, so only the click events' few fields
+    cross the wire. response_hook is passed on to query_items (e.g.
+    Timings.charge).
+    """
+    query, parameters = build_analytics_query(
+        start_dt=start_dt,
+        end_dt=end_dt,
+        category=category,
+        types=['citation_click'],
+        fields=CLICK_FIELDS,
+        tool_content=False
+    )
+    items = container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True,
+                                  response_hook=response_hook)
+    if start_dt and end_dt:
+        return [item for item in items if item_in_range(item, start_dt, end_dt)]
+    return list(items)
+
+
+def fetch_citation_clicks_async(container, start_dt=None, end_dt=None, category=None, response_hook=None):
+    """Start fetch_citation_clicks on a worker thread; returns a Future."""
+    return _fetch_executor.submit(fetch_citation_clicks, container, start_dt, end_dt, category, response_hook)
+
+
+def fetch_page(container, query, parameters, page_size, continuation_token=None, keep=None, response_hook=None):
+    """
+    One page of a query: (items, continuation token for the next page, or
+    None at the end). Pages whose items are all rejected by keep (e.g. the
+    coarse date bounds' edges) are skipped, so an empty page only comes
+    back at the end of the results.
+    """
+    pager = container.query_items(
+        query=query,
+        parameters=parameters,
+        enable_cross_partition_query=True,
+        max_item_count=page_size,
+        response_hook=response_hook
+    ).by_page(continuation_token)
+    for page in pager:
+        items = [item for item in page if keep is None or keep(item)]
+        token = pager.continuation_token
+        if items or not token:
+            return items, token
+    return [], None
+
+
+def fetch_user_ids(container, start_dt=None, end_dt=None, response_hook=None):
+    """
+    Distinct user IDs with activity in [start_dt, end_dt] (coarse day
+    bounds), computed server-side so only the IDs cross the wire.
+    """
+    query, parameters = build_analytics_query(start_dt=start_dt, end_dt=end_dt, select="DISTINCT VALUE c.userId")
+    return {
+        user_id for user_id in container.query_items(query=query, parameters=parameters,
+                                                     enable_cross_partition_query=True, response_hook=response_hook)
+        if user_id
+    }
+
+
+def get_all_time_totals(container, response_hook=None):
+    """
+    All-time question and user totals, computed server-side.
+    Only a count and the distinct userId values come back over the wire,
+    never the documents themselves.
+    """
+    count_query = "SELECT VALUE COUNT(1) FROM c WHERE c.role = 'user'"
+    users_query = (
+        "SELECT DISTINCT VALUE c.userId FROM c "
+        "WHERE c.role = 'user' AND IS_STRING(c.userId) AND c.userId != ''"
+    )
+    # Aggregates can come back as one partial result per partition; sum them.
+    total_questions = sum(container.query_items(
+        query=count_query, enable_cross_partition_query=True, response_hook=response_hook))
+    unique_users = sum(1 for _ in container.query_items(
+        query=users_query, enable_cross_partition_query=True, response_hook=response_hook))
+    return {
+        "totalQuestions": total_questions,
+        "uniqueUsers": unique_users
+    }
@@ -0,0 +1,119 @@
+import logging
+from datetime import datetime
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+from shared_code.rollups import rollup_id
+from shared_code.timestamps import document_epoch, utc_datetime
+
+# Optimistic-concurrency retries when marking a rollup document
+MAX_WRITE_ATTEMPTS = 10
+
+
+def document_day(doc):
+    """UTC date of a document's createdAt (falling back to timestamp), or None."""
+    epoch = document_epoch(doc)
+    if epoch is None:
+        return None
+    return utc_datetime(epoch).date()
+
+
+def mark_days_changed(rollup_container, force_id, days, changed_at=None):
+    """
+    Record on each day's rollup document when the feed last changed that
+    day. read_daily_rollup ignores a rollup generated before its
+    lastChangeAt, so GetAnalytics and BuildDailyRollups rebuild it. Days
+    without a rollup yet get a stub holding only the marker.
+    Returns the number of rollup documents written.
+    """
+    changed_at = changed_at or datetime.utcnow().isoformat()
+    written = 0
+    for day in sorted(days):
+        item_id = rollup_id(force_id, day)
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            try:
+                doc = rollup_container.read_item(item=item_id, partition_key=force_id)
+            except exceptions.CosmosResourceNotFoundError:
+                doc = None
+            if doc and doc.get('lastChangeAt') and doc['lastChangeAt'] >= changed_at:
+                break
+            try:
+                if doc is None:
+                    rollup_container.create_item(body={
+                        'id': item_id,
+                        'forceId': force_id,
+                        'type': 'daily_rollup',
+                        'date': day.isoformat(),
+                        'lastChangeAt': changed_at
+                    })
+                else:
+                    rollup_container.replace_item(
+                        item=item_id,
+                        body=dict(doc, lastChangeAt=changed_at),
+                        etag=doc.get('_etag'),
+                        match_condition=MatchConditions.IfNotModified
+                    )
+                written += 1
+                break
+            except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError):
+                logging.info(f"Rollup {item_id} changed while being marked, retrying.")
+        else:
+            raise Exception(f"Could not mark rollup {item_id} after {MAX_WRITE_ATTEMPTS} attempts")
+    return written
+
+
+def apply_changes(documents, source, rollup_container, force_id):
+    """
+    Mark the daily rollups of the days a change feed batch touches as stale.
+    source names the monitored container in the log. Safe to call again with
+    the same batch (at-least-once delivery): a re-delivered batch only moves
+    lastChangeAt forward. Returns the set of days marked.
+    """
+    days = set()
+    skipped = 0
+    for doc in documents:
+        day = document_day(doc)
+        if day is None:
+            skipped += 1
+            continue
+        days.add(day)
+    written = mark_days_changed(rollup_container, force_id, days)
+    logging.info(f"Change feed ({source}): {len(documents)} documents over {len(days)} days, "
+                 f"{written} rollups marked, {skipped} without a date.")
+    return days
+
+
+class InMemoryChangeFeed:
+    """
+    Local stand-in for a Cosmos change feed with lease checkpoints.
+    Like the real feed it only surfaces the latest version of each document,
+    and a batch whose handler raises is not checkpointed and will be delivered
+    again on the next run.
+    """
+
+    def __init__(self):
+        self._lsn = 0
+        self._latest = {}  # id -> (lsn, doc)
+        self.leases = {}  # lease name -> checkpointed lsn
+
+    def upsert(self, doc):
+        self._lsn += 1
+        doc = dict(doc, _lsn=self._lsn)
+        self._latest[doc['id']] = (self._lsn, doc)
+        return doc
+
+    def read(self, lease, max_items=100):
+        checkpoint = self.leases.get(lease, 0)
+        pending = sorted((lsn, doc) for lsn, doc in self._latest.values() if lsn > checkpoint)
+        return pending[:max_items]
+
+    def run(self, handler, lease='default', max_items=100):
+        """Deliver pending changes to handler(documents) until caught up; returns batches delivered."""
+        batches = 0
+        while True:
+            batch = self.read(lease, max_items)
+            if not batch:
+                return batches
+            handler([dict(doc) for _, doc in batch])
+            self.leases[lease] = batch[-1][0]
+            batches += 1
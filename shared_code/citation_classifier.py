@@ -0,0 +1,69 @@
+from functools import lru_cache
+
+from shared_code.keyword_matcher import KeywordMatcher
+
+# Citation source keywords, in priority order: the first source with a keyword
+# anywhere in the (lower-cased) title wins.
+CITATION_SOURCES = {
+    'CoP-APP': ['cop-app', 'cop app', 'college of policing', 'authorised professional practice', 'cop-detention', 'cop-general'],
+    'Op Soteria-NOM': ['op soteria-nom', 'op soteria', 'opsoteria', 'operation soteria', 'soteria'],
+    'NPCC': ['npcc-', 'npcc ', 'national police chiefs', 'gravity-matrix', 'oocr-'],
+    'GovUK-CPS': ['govuk-cps', 'govuk cps', 'cps.gov.uk', 'crown prosecution service', 'cps guidance'],
+    'GovUK-Legislation': ['govuk-legislation', 'legislation.gov.uk'],
+    'GovUK-HO': ['govuk-ho', 'govuk ho', 'home office guidance', 'notifiable-offence'],
+    'GovUK-MoJ': ['govuk-moj', 'govuk moj', 'ministry of justice', 'cautions-guidance'],
+    'RCJ': ['rcj-', 'royal courts of justice'],
+    'VKPP': ['vkpp-', 'victims\' commissioner', 'victims commissioner'],
+    'Sentencing Council': ['sent-coun-', 'sentencing council', 'sentencing guidelines'],
+    'BTP-Records-Management': ['btp-records-management'],
+    'BTP-Policy': ['btp-policy-'],
+    'Stop & Search': ['stop and search', 'stop & search', 'stop search'],
+    'PACE': ['pace-', 'police and criminal evidence act'],
+    'SCRS': ['scrs ', 'scrs crime manual', 'scotland'],
+}
+
+OTHER_SOURCE = 'Other Documents'  # Catch-all for unmatched citations
+
+_SOURCE_NAMES = list(CITATION_SOURCES)
+_KEYWORD_SOURCE = {}
+for _index, _keywords in enumerate(CITATION_SOURCES.values()):
+    for _keyword in _keywords:
+        _KEYWORD_SOURCE.setdefault(_keyword, _index)
+
+
+# One regex pass finds every keyword occurrence; the lowest source index over
+# all of them is what the keyword-by-keyword loop would have returned.
+_MATCHER = KeywordMatcher(_KEYWORD_SOURCE)
+
+
+@lru_cache(maxsize=4096)
+def _classify(text):
+    best = None
+    for keyword, _ in _MATCHER.finditer(text):
+        index = _KEYWORD_SOURCE[keyword]
+        if best is None or index < best:
+            best = index
+            if best == 0:
+                break
+    return best
+
+
+def classify_citation(title, url='', default=OTHER_SOURCE):
+    """
+    Source category for a citation title (and optional url), or default when
+    no keyword matches. Results are memoized per distinct title/url.
+    """
+    text = (title or '').lower()
+    if url:
+        text = text + ' ' + url.lower()
+    index = _classify(text)
+    return _SOURCE_NAMES[index] if index is not None else default
+
+
+def classify_many(titles, default=OTHER_SOURCE):
+    """Classify a batch of citation titles; repeated titles are looked up once."""
+    seen = {}
+    for title in titles:
+        if title not in seen:
+            seen[title] = classify_citation(title, default=default)
+    return [seen[title] for title in titles]
@@ -0,0 +1,80 @@
+import json
+from shared_code.citation_classifier import classify_citation
+
+# Compact citation data stored beside each tool message, so readers never
+# have to parse the (often large) JSON content. Bump the version when the
+# shape changes; older summaries are rebuilt by the backfill.
+SUMMARY_FIELD = 'citationSummary'
+SUMMARY_VERSION = 1
+
+TOOL_PLACEHOLDER = "[Tool response - see citation columns for details]"
+
+
+def _tool_data(content):
+    try:
+        data = json.loads(content) if isinstance(content, str) else content
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def build_citation_summary(content):
+    """
+    Summary of a tool message's content:
+    {"version", "count", "citations": [{"title", "url", "source"}], "readable"}
+    where readable is the text shown for the message in exports.
+    """
+    tool_data = _tool_data(content)
+    citations = []
+    if tool_data is not None and isinstance(tool_data.get('citations'), list):
+        for citation in tool_data['citations']:
+            if not isinstance(citation, dict):
+                continue
+            title = citation.get('title') or ''
+            url = citation.get('url') or ''
+            citations.append({'title': title, 'url': url, 'source': classify_citation(title)})
+
+    if tool_data is None:
+        # Not a JSON object; the content itself is the readable text
+        readable = content if isinstance(content, str) else ''
+    else:
+        readable = tool_data.get('answer', '') or tool_data.get('response', '')
+        if not readable and citations:
+            unique_titles = list(dict.fromkeys(c['title'] for c in citations if c['title']))
+            if unique_titles:
+                readable = f"[Citations from: {', '.join(unique_titles[:5])}]"
+        if not readable:
+            readable = tool_data.get('summary', '') or TOOL_PLACEHOLDER
+
+    return {
+        'version': SUMMARY_VERSION,
+        'count': len(citations),
+        'citations': citations,
+        'readable': readable,
+    }
+
+
+def citation_summary(item):
+    """
+    Citation summary of a tool message: the stored one when current, else
+    built from the content (documents not yet enriched or backfilled).
+    """
+    summary = item.get(SUMMARY_FIELD)
+    if isinstance(summary, dict) and summary.get('version') == SUMMARY_VERSION:
+        return summary
+    return build_citation_summary(item.get('content', ''))
+
+
+def needs_summary(doc):
+    """True for tool messages without a current citation summary."""
+    if doc.get('role') != 'tool':
+        return False
+    summary = doc.get(SUMMARY_FIELD)
+    return not (isinstance(summary, dict) and summary.get('version') == SUMMARY_VERSION)
+
+
+# Tool messages the backfill still has to enrich
+BACKFILL_QUERY = (
+    "SELECT * FROM c WHERE c.role = 'tool' AND "
+    f"(NOT IS_DEFINED(c.{SUMMARY_FIELD}) OR c.{SUMMARY_FIELD}.version != {SUMMARY_VERSION})"
+)
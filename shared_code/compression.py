@@ -0,0 +1,121 @@
+import zlib
+import azure.functions as func
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as-is; the headers would eat the saving
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Input is fed to the compressor in slices of this size
+CHUNK_BYTES = 64 * 1024
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Best content coding the client accepts, in our order of preference (br,
+    then gzip), or None for identity. Codings with q=0 are refused.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress_chunks(chunks, encoding):
+    """
+    Incrementally compress an iterable of bytes/str chunks, yielding the
+    compressed output as it becomes available. Producers (e.g. a CSV writer)
+    never need the whole uncompressed body in memory.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, flush = compressor.compress, compressor.flush
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        for start in range(0, len(chunk), CHUNK_BYTES):
+            out = compress(chunk[start:start + CHUNK_BYTES])
+            if out:
+                yield out
+    out = flush()
+    if out:
+        yield out
+
+
+def compress_body(body, encoding):
+    """Compress a whole body (bytes or str) with the given content coding."""
+    return b''.join(compress_chunks([body], encoding))
+
+
+def encoded_etag(etag, encoding):
+    """Per-coding variant of a strong ETag: '"abc"' -> '"abc-gzip"'."""
+    if not etag or not encoding:
+        return etag
+    return etag[:-1] + '-' + encoding + '"'
+
+
+def negotiated_etag(req, etag, size):
+    """The ETag compressed_response would send for a body of size bytes."""
+    encoding = choose_encoding(req.headers.get('Accept-Encoding'))
+    return encoded_etag(etag, encoding) if size >= MIN_COMPRESS_BYTES else etag
+
+
+def compressed_response(req, body, status_code=200, mimetype=None, headers=None, charset='utf-8'):
+    """
+    HttpResponse for body, compressed when the request's Accept-Encoding
+    allows it and the body is worth compressing. body may be bytes, str, or
+    an iterable of chunks (compressed incrementally as it is consumed; for an
+    identity response the chunks are joined, since HttpResponse needs the
+    whole body). Sets Content-Encoding, Vary and a per-coding ETag.
+    """
+    headers = dict(headers or {})
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding(req.headers.get('Accept-Encoding'))
+
+    if isinstance(body, (bytes, str)):
+        data = body.encode(charset) if isinstance(body, str) else body
+        if encoding and len(data) >= MIN_COMPRESS_BYTES:
+            data = compress_body(data, encoding)
+        else:
+            encoding = None
+    elif encoding:
+        data = b''.join(compress_chunks(body, encoding))
+    else:
+        data = b''.join(chunk.encode(charset) if isinstance(chunk, str) else chunk for chunk in body)
+
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        if 'ETag' in headers:
+            headers['ETag'] = encoded_etag(headers['ETag'], encoding)
+    return func.HttpResponse(
+        data,
+        status_code=status_code,
+        mimetype=mimetype,
+        charset=charset,
+        headers=headers
+    )
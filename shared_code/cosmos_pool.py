@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.cosmos import CosmosClient
+
+# Default number of pooled HTTPS connections per client; concurrent
+# invocations in the same worker share them.
+DEFAULT_POOL_SIZE = 32
+
+# Secondary database holding the conversation history and citation clicks
+HISTORY_DATABASE = 'db_conversation_history'
+HISTORY_CONTAINER = 'Conversations'
+
+_lock = threading.Lock()
+_clients = {}  # (endpoint, key) -> CosmosClient
+_databases = {}  # (endpoint, key, database) -> DatabaseProxy
+_containers = {}  # (endpoint, key, database, container) -> ContainerProxy
+
+
+def _settings(endpoint, key):
+    endpoint = endpoint or os.environ.get('COSMOS_DB_ENDPOINT')
+    key = key or os.environ.get('COSMOS_DB_KEY')
+    if not endpoint or not key:
+        raise Exception('COSMOS_DB_ENDPOINT or COSMOS_DB_KEY environment variable not set')
+    return endpoint, key
+
+
+def _new_client(endpoint, key):
+    pool_size = int(os.environ.get('COSMOS_DB_CONNECTION_POOL_SIZE', DEFAULT_POOL_SIZE))
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    logging.info(f"Creating shared Cosmos DB client for {endpoint} (pool size {pool_size}).")
+    return CosmosClient(endpoint, key, transport=RequestsTransport(session=session, session_owner=False))
+
+
+def get_client(endpoint=None, key=None):
+    """
+    The worker-wide CosmosClient for an account, created on first use.
+    Defaults to COSMOS_DB_ENDPOINT / COSMOS_DB_KEY.
+    """
+    endpoint, key = _settings(endpoint, key)
+    client = _clients.get((endpoint, key))
+    if client is None:
+        with _lock:
+            client = _clients.get((endpoint, key))
+            if client is None:
+                client = _new_client(endpoint, key)
+                _clients[(endpoint, key)] = client
+    return client
+
+
+def get_database(database_name=None, endpoint=None, key=None):
+    """Cached database proxy; defaults to COSMOS_DB_DATABASE."""
+    endpoint, key = _settings(endpoint, key)
+    database_name = database_name or os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+    cache_key = (endpoint, key, database_name)
+    db = _databases.get(cache_key)
+    if db is None:
+        db = get_client(endpoint, key).get_database_client(database_name)
+        _databases[cache_key] = db
+    return db
+
+
+def get_container(container_name=None, database_name=None, endpoint=None, key=None):
+    """Cached container proxy; defaults to COSMOS_DB_CONTAINER in COSMOS_DB_DATABASE."""
+    endpoint, key = _settings(endpoint, key)
+    database_name = database_name or os.environ.get('COSMOS_DB_DATABASE', 'coppa-db')
+    container_name = container_name or os.environ.get('COSMOS_DB_CONTAINER', 'questions')
+    cache_key = (endpoint, key, database_name, container_name)
+    container = _containers.get(cache_key)
+    if container is None:
+        container = get_database(database_name, endpoint, key).get_container_client(container_name)
+        _containers[cache_key] = container
+    return container
+
+
+def get_history_container(endpoint=None, key=None):
+    """The conversation history container that holds citation clicks."""
+    return get_container(HISTORY_CONTAINER, HISTORY_DATABASE, endpoint, key)
@@ -0,0 +1,105 @@
+import logging
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+from shared_code import citation_summary
+from shared_code import title_index
+from shared_code.response_cache import TTLCache
+from shared_code.timestamps import EPOCH_KEY
+
+# Etags of the versions this worker wrote while enriching. Such a version
+# comes back through the change feed (normally to the same lease owner)
+# differing only in derived fields, so it does not change any day's metrics.
+_enrichment_etags = TTLCache(20000)
+_ENRICHMENT_ETAG_TTL = 60 * 60
+
+
+# Derived fields stored by the enrichment, by name
+DERIVED_FIELDS = (citation_summary.SUMMARY_FIELD, title_index.TITLE_FIELD)
+
+
+def pending_fields(doc, names=DERIVED_FIELDS):
+    """Derived fields (of those in names) a document is missing or has stale, by name."""
+    fields = {}
+    if citation_summary.SUMMARY_FIELD in names and citation_summary.needs_summary(doc):
+        fields[citation_summary.SUMMARY_FIELD] = citation_summary.build_citation_summary(doc.get('content', ''))
+    if title_index.TITLE_FIELD in names and title_index.needs_title_index(doc):
+        fields[title_index.TITLE_FIELD] = title_index.normalize_title(doc['title'])
+    return fields
+
+
+def store_fields(container, doc, fields):
+    """
+    Add fields to a document and write it back, guarded by its etag. Returns
+    False if the document changed in the meantime (its newer version gets
+    enriched when it comes through the change feed).
+    """
+    body = {key: value for key, value in doc.items() if key != EPOCH_KEY}
+    body.update(fields)
+    try:
+        if body.get('_etag'):
+            written = container.replace_item(
+                item=body['id'],
+                body=body,
+                etag=body['_etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+        else:
+            written = container.replace_item(item=body['id'], body=body)
+    except exceptions.CosmosAccessConditionFailedError:
+        logging.info(f"Document {body['id']} changed before it could be enriched, skipping.")
+        return False
+    if isinstance(written, dict) and written.get('_etag'):
+        _enrichment_etags.set(written['_etag'], True, ttl=_ENRICHMENT_ETAG_TTL)
+    doc.update(fields)
+    return True
+
+
+def is_enrichment_write(doc):
+    """True for a document version this worker wrote only to add derived fields."""
+    etag = doc.get('_etag')
+    return bool(etag) and _enrichment_etags.get(etag, False)
+
+
+def enrich_documents(container, documents, names=DERIVED_FIELDS):
+    """
+    Store the derived fields in names (default: citation summary and
+    titleLower) on the documents in a change feed batch that lack them; one
+    write per document.
+    """
+    enriched = 0
+    for doc in documents:
+        if not doc.get('id'):
+            continue
+        fields = pending_fields(doc, names)
+        if fields and store_fields(container, doc, fields):
+            enriched += 1
+    return enriched
+
+
+def backfill(container, query, max_items=1000, names=DERIVED_FIELDS):
+    """
+    Enrich up to max_items existing documents returned by query with the
+    derived fields in names. Returns {"scanned", "enriched"}; run again
+    until scanned is 0.
+    """
+    scanned = 0
+    enriched = 0
+    for doc in container.query_items(query=query, enable_cross_partition_query=True):
+        scanned += 1
+        fields = pending_fields(doc, names)
+        if fields and store_fields(container, doc, fields):
+            enriched += 1
+        if scanned >= max_items:
+            break
+    return {'scanned': scanned, 'enriched': enriched}
+
+
+def backfill_citation_summaries(container, max_items=1000):
+    """Backfill tool messages with no (or an outdated) citation summary."""
+    return backfill(container, citation_summary.BACKFILL_QUERY, max_items, (citation_summary.SUMMARY_FIELD,))
+
+
+def backfill_title_index(container, max_items=1000):
+    """Backfill conversations with no (or a stale) titleLower."""
+    return backfill(container, title_index.BACKFILL_QUERY, max_items, (title_index.TITLE_FIELD,))
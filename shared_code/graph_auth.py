@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+import msal
+
+GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+# Tokens are renewed this long before they expire, so a request never starts with one about to lapse
+REFRESH_MARGIN_SECONDS = 300
+
+_lock = threading.Lock()
+_providers = {}  # (client_id, tenant_id, client_secret) -> GraphTokenProvider
+
+
+def _msal_app(client_id, authority, client_secret):
+    return msal.ConfidentialClientApplication(
+        client_id,
+        authority=authority,
+        client_credential=client_secret
+    )
+
+
+class GraphTokenProvider:
+    """
+    App-only Microsoft Graph access tokens for one app registration. The
+    MSAL application (and its token cache) lives as long as the provider, and
+    the current token is reused until REFRESH_MARGIN_SECONDS before it
+    expires, so most invocations make no AAD round-trip.
+
+    app_factory(client_id, authority, client_secret) builds the MSAL
+    application; pass a fake to run without an authority.
+    """
+
+    def __init__(self, client_id, tenant_id, client_secret, app_factory=_msal_app, clock=time.time,
+                 refresh_margin=REFRESH_MARGIN_SECONDS, scopes=GRAPH_SCOPES):
+        self.authority = f"https://login.microsoftonline.com/{tenant_id}"
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._app_factory = app_factory
+        self._clock = clock
+        self._refresh_margin = refresh_margin
+        self._scopes = list(scopes)
+        self._app = None
+        self._result = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+
+    def _valid(self):
+        return self._result is not None and self._clock() < self._expires_at - self._refresh_margin
+
+    def acquire_token(self):
+        """
+        MSAL-style result: {"access_token": ..., "expires_in": ...} or, on
+        failure, {"error": ..., "error_description": ...}. Failures are not
+        cached; the next call tries again.
+        """
+        if self._valid():
+            return self._result
+        with self._lock:
+            if self._valid():
+                return self._result
+            if self._app is None:
+                self._app = self._app_factory(self._client_id, self.authority, self._client_secret)
+            requested_at = self._clock()
+            result = self._app.acquire_token_for_client(scopes=self._scopes)
+            self.acquisitions += 1
+            if "access_token" not in result:
+                return result
+            try:
+                expires_in = float(result.get("expires_in", 0))
+            except (TypeError, ValueError):
+                expires_in = 0
+            self._result = result
+            self._expires_at = requested_at + expires_in
+            logging.info(f"Acquired Graph API token (expires in {expires_in:.0f}s).")
+            return result
+
+    def get_token(self):
+        """The access token, or None (the failure is logged)."""
+        result = self.acquire_token()
+        if "access_token" not in result:
+            logging.warning(f"Failed to obtain Graph API token: {result.get('error_description')}")
+            return None
+        return result["access_token"]
+
+    def invalidate(self):
+        """Drop the current token (e.g. after Graph rejected it with 401)."""
+        with self._lock:
+            self._result = None
+            self._expires_at = 0
+
+
+def get_token_provider(client_id=None, tenant_id=None, client_secret=None, app_factory=None):
+    """
+    The worker-wide token provider for an app registration, created on first
+    use. Defaults to GRAPH_CLIENT_ID / GRAPH_TENANT_ID / GRAPH_CLIENT_SECRET;
+    None if they are not configured. app_factory only applies when the
+    provider is created.
+    """
+    client_id = client_id or os.environ.get('GRAPH_CLIENT_ID')
+    tenant_id = tenant_id or os.environ.get('GRAPH_TENANT_ID')
+    client_secret = client_secret or os.environ.get('GRAPH_CLIENT_SECRET')
+    if not client_id or not tenant_id or not client_secret:
+        return None
+    cache_key = (client_id, tenant_id, client_secret)
+    provider = _providers.get(cache_key)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(cache_key)
+            if provider is None:
+                provider = GraphTokenProvider(client_id, tenant_id, client_secret, app_factory=app_factory or _msal_app)
+                _providers[cache_key] = provider
+    return provider
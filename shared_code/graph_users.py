@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+
+# Microsoft Graph accepts at most 20 requests in one JSON $batch
+BATCH_SIZE = 20
+DEFAULT_CONCURRENCY = 4
+# Attempts per batch before giving up on the users still throttled
+MAX_ATTEMPTS = 4
+# Upper bound on a single Retry-After wait so a throttled export still finishes
+MAX_RETRY_AFTER_SECONDS = 30
+DEFAULT_RETRY_AFTER_SECONDS = 2
+REQUEST_TIMEOUT_SECONDS = 15
+USER_SELECT = 'displayName,userPrincipalName,jobTitle,department'
+RETRY_STATUSES = (429, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def graph_base_url():
+    """Graph endpoint; GRAPH_API_URL points the lookups at another host (e.g. a local mock)."""
+    return os.environ.get('GRAPH_API_URL', 'https://graph.microsoft.com/v1.0').rstrip('/')
+
+
+def get_session():
+    """The worker-wide requests.Session used for Graph calls, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.environ.get('GRAPH_CONCURRENCY', DEFAULT_CONCURRENCY)) * 2
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def unknown_user():
+    return {'displayName': 'Unknown', 'email': '', 'jobTitle': '', 'department': ''}
+
+
+def _user_entry(user_data):
+    return {
+        'displayName': user_data.get('displayName', 'Unknown'),
+        'email': user_data.get('userPrincipalName', ''),
+        'jobTitle': user_data.get('jobTitle', ''),
+        'department': user_data.get('department', '')
+    }
+
+
+def _retry_after(headers):
+    """Seconds to wait from a Retry-After header (Graph sends whole seconds)."""
+    try:
+        seconds = float((headers or {}).get('Retry-After') or (headers or {}).get('retry-after'))
+    except (TypeError, ValueError):
+        seconds = DEFAULT_RETRY_AFTER_SECONDS
+    return min(max(seconds, 0), MAX_RETRY_AFTER_SECONDS)
+
+
+def _lookup_batch(session, base_url, user_ids, access_token, sleep=time.sleep):
+    """
+    Look up one batch of at most BATCH_SIZE users with a single $batch call.
+    Throttled requests (the whole batch or individual entries) are retried
+    after their Retry-After. Users that do not exist map to None; users that
+    could not be looked up (other errors, or still throttled after
+    MAX_ATTEMPTS) are left out.
+    """
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    results = {}
+    failed = []
+    pending = list(user_ids)
+    for attempt in range(MAX_ATTEMPTS):
+        if not pending:
+            break
+        payload = {'requests': [
+            {'id': str(index), 'method': 'GET', 'url': f"/users/{quote(user_id, safe='@')}?$select={USER_SELECT}"}
+            for index, user_id in enumerate(pending)
+        ]}
+        wait = 0
+        retry = []
+        try:
+            response = session.post(f"{base_url}/$batch", json=payload, headers=headers,
+                                    timeout=REQUEST_TIMEOUT_SECONDS)
+        except Exception as e:
+            logging.error(f"Error fetching a batch of {len(pending)} users: {str(e)}")
+            retry, wait = pending, DEFAULT_RETRY_AFTER_SECONDS
+        else:
+            if response.status_code in RETRY_STATUSES:
+                retry, wait = pending, _retry_after(response.headers)
+            elif response.status_code != 200:
+                logging.warning(f"Could not fetch a batch of {len(pending)} users: {response.status_code}")
+                break
+            else:
+                for entry in response.json().get('responses', []):
+                    try:
+                        user_id = pending[int(entry.get('id'))]
+                    except (TypeError, ValueError, IndexError):
+                        continue
+                    status = entry.get('status')
+                    if status == 200:
+                        results[user_id] = _user_entry(entry.get('body') or {})
+                    elif status in RETRY_STATUSES:
+                        retry.append(user_id)
+                        wait = max(wait, _retry_after(entry.get('headers')))
+                    elif status == 404:
+                        logging.warning(f"Could not fetch user {user_id}: {status}")
+                        results[user_id] = None
+                    else:
+                        logging.warning(f"Could not fetch user {user_id}: {status}")
+                        failed.append(user_id)
+                # Entries missing from the response are retried as well
+                retry.extend(user_id for user_id in pending
+                             if user_id not in results and user_id not in retry and user_id not in failed)
+        pending = retry
+        if pending and attempt + 1 < MAX_ATTEMPTS:
+            logging.info(f"Graph throttled {len(pending)} user lookups; retrying in {wait:g}s.")
+            sleep(wait)
+    if pending:
+        logging.warning(f"Gave up on {len(pending)} throttled user lookups.")
+    return results
+
+
+def lookup_users(user_ids, access_token, base_url=None, session=None, concurrency=None):
+    """
+    Look up users in Microsoft Graph, BATCH_SIZE at a time through JSON
+    $batch, with up to `concurrency` batches (GRAPH_CONCURRENCY, default 4)
+    in flight on the pooled session. Returns user ID -> details, or None for
+    users that do not exist; users that could not be looked up are left out.
+    """
+    unique_ids = list(dict.fromkeys(user_id for user_id in user_ids or () if user_id))
+    if not unique_ids or not access_token:
+        return {}
+    base_url = (base_url or graph_base_url()).rstrip('/')
+    session = session or get_session()
+    concurrency = concurrency or int(os.environ.get('GRAPH_CONCURRENCY', DEFAULT_CONCURRENCY))
+    batches = [unique_ids[i:i + BATCH_SIZE] for i in range(0, len(unique_ids), BATCH_SIZE)]
+
+    results = {}
+    if len(batches) == 1 or concurrency <= 1:
+        for batch in batches:
+            results.update(_lookup_batch(session, base_url, batch, access_token))
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches)), thread_name_prefix='graph-users') as pool:
+            for result in pool.map(lambda batch: _lookup_batch(session, base_url, batch, access_token), batches):
+                results.update(result)
+
+    logging.info(f"Looked up {len(results)} of {len(unique_ids)} users in {len(batches)} Graph batch calls.")
+    return results
+
+
+def get_user_details(user_ids, access_token, base_url=None, session=None, concurrency=None):
+    """
+    Fetch user details from Microsoft Graph API for a list of user IDs.
+    Returns a dictionary mapping user ID to user details; users that were not
+    found or could not be looked up map to 'Unknown'.
+    """
+    user_cache = {}
+
+    if not user_ids or not access_token:
+        return user_cache
+
+    found = lookup_users(user_ids, access_token, base_url, session, concurrency)
+    for user_id in dict.fromkeys(user_ids):
+        if user_id:
+            user_cache[user_id] = found.get(user_id) or unknown_user()
+    return user_cache
@@ -0,0 +1,52 @@
+import re
+
+
+def trie_pattern(keywords):
+    """
+    Regex source for a character trie of the keywords. Shared prefixes are
+    factored out so the engine branches on one character at a time, and longer
+    continuations are tried before stopping, so the longest keyword starting at
+    a position is the one reported.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Finds every occurrence of a fixed set of keywords in one regex pass.
+    A zero-width lookahead reports the longest keyword at every position where
+    one starts, so overlapping occurrences are all seen; keywords that are
+    prefixes of the reported one matched at the same position too.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(kw for kw in keywords if kw))
+        self._prefixes = {
+            keyword: [other for other in self.keywords if keyword.startswith(other)]
+            for keyword in self.keywords
+        }
+        self._pattern = re.compile('(?=(' + trie_pattern(self.keywords) + '))') if self.keywords else None
+
+    def finditer(self, text):
+        """Yield (keyword, start) for every keyword occurrence in text."""
+        if self._pattern is None:
+            return
+        for match in self._pattern.finditer(text):
+            for keyword in self._prefixes[match.group(1)]:
+                yield keyword, match.start()
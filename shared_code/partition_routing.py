@@ -0,0 +1,124 @@
+import logging
+import threading
+from azure.cosmos import exceptions
+
+from shared_code.response_cache import TTLCache
+
+_lock = threading.Lock()
+_partition_paths = {}  # container link -> partition key path, or None if unusable
+# conversationId -> partition key value, learned from fan-out reads
+_conversation_partitions = TTLCache(10000)
+_CONVERSATION_PARTITION_TTL = 24 * 60 * 60
+
+
+def partition_key_path(container):
+    """
+    The container's partition key path (e.g. '/userId'), read once from the
+    container properties. None for hierarchical keys or when the properties
+    cannot be read; callers then fall back to cross-partition queries.
+    """
+    link = getattr(container, 'container_link', None) or id(container)
+    if link in _partition_paths:
+        return _partition_paths[link]
+    path = None
+    try:
+        paths = container.read().get('partitionKey', {}).get('paths', [])
+        if len(paths) == 1:
+            path = paths[0]
+    except Exception as e:
+        logging.warning(f"Could not read partition key of {link}: {e}")
+    with _lock:
+        _partition_paths[link] = path
+    logging.info(f"Partition key for {link}: {path}")
+    return path
+
+
+def partition_value(container, doc):
+    """The partition key value of a document, or None if it cannot be derived."""
+    path = partition_key_path(container)
+    if not path or path.count('/') != 1:
+        return None
+    return doc.get(path[1:])
+
+
+def point_read(container, item_id, partition_key):
+    """read_item (about 1 RU), or None if the document does not exist."""
+    try:
+        return container.read_item(item=item_id, partition_key=partition_key)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+def query(container, query_text, parameters, partition_key=None):
+    """Single-partition query when the partition key is known, else a fan-out."""
+    if partition_key is not None:
+        return list(container.query_items(query=query_text, parameters=parameters, partition_key=partition_key))
+    return list(container.query_items(query=query_text, parameters=parameters, enable_cross_partition_query=True))
+
+
+def conversation_partition(container, conversation_id, conversation=None, user_id=None):
+    """
+    Partition key value shared by a conversation's messages, or None when they
+    are not co-located (or it is not known yet).
+    """
+    path = partition_key_path(container)
+    if path == '/conversationId':
+        return conversation_id
+    if path == '/userId':
+        if conversation and conversation.get('userId'):
+            return conversation['userId']
+        return user_id or _conversation_partitions.get(conversation_id)
+    return None
+
+
+def remember_conversation_partition(container, conversation_id, doc):
+    """Record the partition a conversation lives in, so later reads are routed."""
+    value = partition_value(container, doc)
+    if value is not None:
+        _conversation_partitions.set(conversation_id, value, ttl=_CONVERSATION_PARTITION_TTL)
+
+
+def read_conversation_items(container, conversation_id, user_id=None):
+    """
+    The conversation document and all of its messages, routed by the
+    container's partition key:
+    - /userId with a known user: point read plus a single-partition query
+    - /conversationId: single-partition query
+    - /id: point read of the conversation plus a fan-out for its messages
+    - anything else (or unknown user): one fan-out query, whose result is
+      remembered so the next read of the conversation is routed directly.
+    """
+    path = partition_key_path(container)
+    cid_param = [{"name": "@cid", "value": conversation_id}]
+    partition = conversation_partition(container, conversation_id, user_id=user_id)
+
+    if path == '/userId' and partition is not None:
+        conversation = point_read(container, conversation_id, partition)
+        if conversation is not None:
+            messages = query(container, "SELECT * FROM c WHERE c.conversationId = @cid", cid_param, partition)
+            return _merge([conversation], messages)
+
+    elif path == '/conversationId':
+        items = query(container, "SELECT * FROM c WHERE c.conversationId = @cid OR c.id = @cid", cid_param, partition)
+        if any(item.get('id') == conversation_id for item in items):
+            return items
+        # The conversation document itself is not in the conversation's partition
+        return _merge(items, query(container, "SELECT * FROM c WHERE c.id = @cid", cid_param))
+
+    elif path == '/id':
+        conversation = point_read(container, conversation_id, conversation_id)
+        messages = query(container, "SELECT * FROM c WHERE c.conversationId = @cid", cid_param)
+        return _merge([conversation] if conversation else [], messages)
+
+    items = query(container, "SELECT * FROM c WHERE c.conversationId = @cid OR c.id = @cid", cid_param)
+    for item in items:
+        if item.get('id') == conversation_id:
+            remember_conversation_partition(container, conversation_id, item)
+            break
+    return items
+
+
+def _merge(first, second):
+    """Concatenate two result lists, dropping documents already present."""
+    seen = {item.get('id') for item in first}
+    return first + [item for item in second if item.get('id') not in seen]
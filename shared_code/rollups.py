@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+from datetime import datetime, time, timedelta
+from azure.core import MatchConditions
+from azure.cosmos import PartitionKey, exceptions
+
+from shared_code.analytics_aggregation import aggregate_items
+from shared_code.analytics_queries import build_analytics_query, fetch_citation_clicks_async, item_in_range
+from shared_code.theme_taxonomy import get_theme_matcher
+
+# Bump when the shape of the stored metrics changes; older rollups are rebuilt.
+ROLLUP_VERSION = 1
+# Optimistic-concurrency retries when storing a rollup next to the change feed's marker
+MAX_WRITE_ATTEMPTS = 5
+# Rollups keep per-conversation and per-user ids (for distinct counts across
+# days); a day bigger than this is not stored but scanned live, well within
+# Cosmos DB's 2 MB item limit
+DEFAULT_MAX_ROLLUP_BYTES = 1_500_000
+
+_rollup_containers = {}  # (database proxy, container name) -> ContainerProxy
+
+
+def get_rollup_container(db):
+    """
+    Container holding one rollup document per day and force, partitioned by
+    forceId. It is created if missing on first use; the proxy is then cached
+    for the (pooled) database proxy.
+    """
+    container_name = os.environ.get('COSMOS_DB_ROLLUP_CONTAINER', 'dailyRollups')
+    container = _rollup_containers.get((db, container_name))
+    if container is None:
+        container = db.create_container_if_not_exists(
+            id=container_name,
+            partition_key=PartitionKey(path='/forceId')
+        )
+        _rollup_containers[(db, container_name)] = container
+    return container
+
+
+def rollup_id(force_id, day):
+    return f"rollup-{force_id}-{day.isoformat()}"
+
+
+def day_window(day):
+    """Naive [start, end] datetimes covering a whole UTC day."""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1) - timedelta(microseconds=1)
+
+
+def split_window(start_dt, end_dt, today):
+    """
+    Split a naive [start_dt, end_dt] range into whole completed days that can be
+    served from rollups, plus the leftover windows (partial edge days and
+    today) that have to be scanned live.
+    Returns (days, live_windows).
+    """
+    first = start_dt.date()
+    if start_dt > datetime.combine(first, time.min):
+        first += timedelta(days=1)
+    last = end_dt.date()
+    # The dashboard sends endDate as 23:59:59, treat that as the whole day
+    if end_dt < datetime.combine(last, time(23, 59, 59)):
+        last -= timedelta(days=1)
+    last = min(last, today - timedelta(days=1))
+    if first > last:
+        return [], [(start_dt, end_dt)]
+
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    live_windows = []
+    first_start, _ = day_window(first)
+    if start_dt < first_start:
+        live_windows.append((start_dt, first_start - timedelta(microseconds=1)))
+    after_last = datetime.combine(last + timedelta(days=1), time.min)
+    if after_last <= end_dt:
+        live_windows.append((after_last, end_dt))
+    return days, live_windows
+
+
+def iter_window_items(container, container2, start_dt, end_dt):
+    """
+    Stream the documents in [start_dt, end_dt] from the primary container, plus
+    citation clicks from the secondary container when one is given. The
+    clicks are fetched concurrently while the primary pager is consumed.
+    """
+    clicks = fetch_citation_clicks_async(container2, start_dt, end_dt) if container2 is not None else None
+    query, parameters = build_analytics_query(start_dt=start_dt, end_dt=end_dt)
+    for item in container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True):
+        if item_in_range(item, start_dt, end_dt):
+            yield item
+    if clicks is not None:
+        try:
+            yield from clicks.result()
+        except Exception as e:
+            logging.warning(f"Could not fetch from secondary container: {e}")
+
+
+def build_daily_rollup(container, container2, force_id, day):
+    """
+    Aggregate one whole day from the raw documents into a rollup document.
+    generatedAt is taken before the scan, so a change the feed records while
+    the day is being scanned still marks the rollup as stale.
+
+    Response times are measured within the day: a question asked just
+    before midnight UTC whose first response comes after it has no response
+    time in either day's rollup (a live scan across both days has one), so
+    avgResponseTimeSeconds over rollups leaves those questions out.
+    """
+    generated_at = datetime.utcnow().isoformat()
+    start_dt, end_dt = day_window(day)
+    metrics = aggregate_items(iter_window_items(container, container2, start_dt, end_dt))
+    return {
+        'id': rollup_id(force_id, day),
+        'forceId': force_id,
+        'type': 'daily_rollup',
+        'date': day.isoformat(),
+        'version': ROLLUP_VERSION,
+        'taxonomyVersion': get_theme_matcher().version,
+        'generatedAt': generated_at,
+        'documentCount': metrics['totalInteractions'],
+        'metrics': metrics
+    }
+
+
+def read_daily_rollup(rollup_container, force_id, day):
+    """
+    Point read of a stored rollup; None if missing, from an older version,
+    built with a different theme taxonomy, or stale: the change feed records
+    the last change to the day's documents as lastChangeAt on the same
+    document, and a rollup generated before it no longer matches the day.
+    A current rollup of a day too big to store comes back with oversized
+    set and no metrics; that day is scanned live.
+    """
+    try:
+        doc = rollup_container.read_item(item=rollup_id(force_id, day), partition_key=force_id)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    if doc.get('version') != ROLLUP_VERSION:
+        return None
+    if doc.get('taxonomyVersion') != get_theme_matcher().version:
+        return None
+    if doc.get('lastChangeAt') and doc['lastChangeAt'] > doc.get('generatedAt', ''):
+        return None
+    return doc
+
+
+def write_daily_rollup(rollup_container, doc):
+    """
+    Store a rebuilt rollup, keeping the lastChangeAt the change feed wrote on
+    the existing document. The write is guarded by its etag, so a change
+    marked while the day was being rebuilt is never overwritten.
+    A rollup over ROLLUP_MAX_BYTES (default 1.5 MB) is stored without its
+    metrics and flagged oversized, so the day is neither rebuilt on every
+    request nor written past the item size limit.
+    """
+    item_id = doc['id']
+    max_bytes = int(os.environ.get('ROLLUP_MAX_BYTES', DEFAULT_MAX_ROLLUP_BYTES))
+    size = len(json.dumps(doc).encode('utf-8'))
+    if size > max_bytes:
+        logging.warning(f"Rollup {item_id} is {size} bytes (limit {max_bytes}); that day is scanned live.")
+        doc = dict({key: value for key, value in doc.items() if key != 'metrics'}, oversized=True, size=size)
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        try:
+            current = rollup_container.read_item(item=item_id, partition_key=doc['forceId'])
+        except exceptions.CosmosResourceNotFoundError:
+            current = None
+        body = dict(doc)
+        if current and current.get('lastChangeAt'):
+            body['lastChangeAt'] = current['lastChangeAt']
+        try:
+            if current is None:
+                rollup_container.create_item(body=body)
+            else:
+                rollup_container.replace_item(
+                    item=item_id,
+                    body=body,
+                    etag=current.get('_etag'),
+                    match_condition=MatchConditions.IfNotModified
+                )
+            return body
+        except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError):
+            logging.info(f"Rollup {item_id} changed while being written, retrying.")
+    raise Exception(f"Could not store rollup {item_id} after {MAX_WRITE_ATTEMPTS} attempts")
+
+
+def stale_rollup_days(rollup_container, force_id, before):
+    """
+    Days before `before` whose rollup the change feed has marked as changed
+    since it was generated (or that only hold the marker), most recent first.
+    """
+    query = ("SELECT c.date FROM c WHERE c.type = 'daily_rollup' AND IS_DEFINED(c.lastChangeAt) "
+             "AND (NOT IS_DEFINED(c.generatedAt) OR c.lastChangeAt > c.generatedAt) AND c.date < @before")
+    docs = rollup_container.query_items(
+        query=query,
+        parameters=[{"name": "@before", "value": before.isoformat()}],
+        partition_key=force_id
+    )
+    return sorted((datetime.strptime(doc['date'], '%Y-%m-%d').date() for doc in docs), reverse=True)
+
+
+def merge_windows(windows):
+    """Coalesce adjacent or overlapping naive [start, end] windows."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1] + timedelta(microseconds=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def load_window_states(container, container2, rollup_container, force_id, start_dt, end_dt, today=None,
+                       max_builds=None):
+    """
+    Aggregation states covering [start_dt, end_dt]: one stored rollup per
+    completed day plus a live aggregate of the partial windows.
+
+    Missing rollups are built and written on first use, but at most
+    max_builds per request (ROLLUP_MAX_BUILDS_PER_REQUEST, default 3; the
+    most recent days first). The remaining missing days are folded into the
+    live windows, so a long range on a cold rollup container costs one scan
+    rather than one per day; BuildDailyRollups fills them in later.
+    """
+    today = today or datetime.utcnow().date()
+    if max_builds is None:
+        max_builds = int(os.environ.get('ROLLUP_MAX_BUILDS_PER_REQUEST', '3'))
+    days, live_windows = split_window(start_dt, end_dt, today)
+    stored = {day: read_daily_rollup(rollup_container, force_id, day) for day in days}
+    missing = [day for day in days if stored[day] is None]
+    to_build = set(missing[-max_builds:]) if max_builds > 0 else set()
+    oversized = 0
+
+    states = []
+    for day in days:
+        doc = stored[day]
+        if doc is not None and doc.get('oversized'):
+            live_windows.append(day_window(day))
+            oversized += 1
+            continue
+        if doc is None:
+            if day not in to_build:
+                live_windows.append(day_window(day))
+                continue
+            doc = build_daily_rollup(container, container2, force_id, day)
+            try:
+                write_daily_rollup(rollup_container, doc)
+            except Exception as e:
+                logging.warning(f"Could not store rollup for {day}: {e}")
+        states.append(doc['metrics'])
+    live_windows = merge_windows(live_windows)
+    for window_start, window_end in live_windows:
+        states.append(aggregate_items(iter_window_items(container, container2, window_start, window_end)))
+    logging.info(f"Rollups: {len(days) - len(missing) - oversized} days stored, {len(to_build)} built on demand, "
+                 f"{len(missing) - len(to_build) + oversized} scanned live in {len(live_windows)} windows.")
+    return states
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+from azure.cosmos import exceptions
+
+from shared_code.keyword_matcher import KeywordMatcher
+
+# Theme keywords used when no taxonomy is configured (expand as needed)
+DEFAULT_THEME_KEYWORDS = [
+    'stalking', 'domestic abuse', 'warrant', 'warrants', 'theft', 'burglary', 'assault',
+    'missing', 'runaway', 'violence', 'abuse', 'drugs', 'alcohol', 'mental health',
+    'child', 'safeguarding', 'investigation', 'arrest', 'bail', 'custody', 'suicide',
+    'complaint', 'noise', 'property', 'traffic', 'crime', 'enquiry', 'lost', 'report',
+]
+
+TAXONOMY_DOCUMENT_ID = 'theme-taxonomy'
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def normalize_taxonomy(taxonomy):
+    """
+    Normalize a taxonomy into a list of (theme, keywords, word_boundary).
+    Accepts a list of entries, or a dict with a "themes" list and an optional
+    default "wordBoundary". An entry is either a keyword string (the theme is
+    the keyword itself) or {"theme": ..., "keywords": [...], "wordBoundary": bool}.
+    """
+    default_boundary = False
+    if isinstance(taxonomy, dict):
+        default_boundary = bool(taxonomy.get('wordBoundary', False))
+        taxonomy = taxonomy.get('themes', [])
+    entries = []
+    for entry in taxonomy or []:
+        if isinstance(entry, str):
+            theme, keywords, boundary = entry, [entry], default_boundary
+        elif isinstance(entry, dict) and entry.get('theme'):
+            theme = entry['theme']
+            keywords = entry.get('keywords') or [theme]
+            boundary = bool(entry.get('wordBoundary', default_boundary))
+        else:
+            logging.warning(f"Ignoring invalid theme taxonomy entry: {entry!r}")
+            continue
+        theme = str(theme).strip().lower()
+        keywords = [str(kw).strip().lower() for kw in keywords if str(kw).strip()]
+        if theme and keywords:
+            entries.append((theme, keywords, boundary))
+    return entries
+
+
+class ThemeMatcher:
+    """
+    Compiled theme taxonomy. All keywords are found in one regex pass over the
+    title and the resulting theme list is memoized per distinct title.
+    Themes come back in taxonomy order, like the keyword-by-keyword loop.
+    """
+
+    def __init__(self, taxonomy, cache_size=8192):
+        self.entries = normalize_taxonomy(taxonomy)
+        self.themes = [theme for theme, _, _ in self.entries]
+        # Keyword -> [(theme position, word boundary)]; a keyword may serve several themes
+        self._keyword_themes = {}
+        for position, (_, keywords, boundary) in enumerate(self.entries):
+            for keyword in keywords:
+                self._keyword_themes.setdefault(keyword, []).append((position, boundary))
+        self._matcher = KeywordMatcher(self._keyword_themes)
+        # Changes whenever the taxonomy does; stored with rollups built from it
+        self.version = hashlib.sha1(json.dumps(self.entries).encode('utf-8')).hexdigest()[:12]
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, title):
+        """Themes found in a title, in taxonomy order."""
+        text = (title or '').lower()
+        found = set()
+        for keyword, start in self._matcher.finditer(text):
+            for position, boundary in self._keyword_themes[keyword]:
+                if position in found:
+                    continue
+                if boundary:
+                    end = start + len(keyword)
+                    if start > 0 and _is_word_char(text[start - 1]):
+                        continue
+                    if end < len(text) and _is_word_char(text[end]):
+                        continue
+                found.add(position)
+        return tuple(self.themes[position] for position in sorted(found))
+
+    def keywords(self, theme):
+        """Keywords of a theme label (case-insensitive), or None if it is not in the taxonomy."""
+        label = (theme or '').strip().lower()
+        for entry_theme, keywords, _ in self.entries:
+            if entry_theme == label:
+                return list(keywords)
+        return None
+
+    def has_theme(self, item, theme):
+        """
+        Whether a theme filter selects item, consistently with the theme
+        breakdowns: its title is tagged with the theme, or its stored themes
+        include it. Labels outside the taxonomy match as a substring of the
+        title or a stored theme.
+        """
+        label = (theme or '').strip().lower()
+        stored = [str(t).strip().lower() for t in item.get('themes', []) or [] if t]
+        if self.keywords(label) is None:
+            return label in (item.get('title') or '').lower() or any(label in t for t in stored)
+        return label in self.match((item.get('title') or '').strip()) or label in stored
+
+
+class _TaxonomySource:
+    """
+    Process-wide current matcher. The configured sources are checked at most
+    every THEME_TAXONOMY_REFRESH_SECONDS and the matcher is only recompiled
+    when the source actually changed (document etag or setting value).
+    """
+
+    def __init__(self):
+        self.matcher = ThemeMatcher(DEFAULT_THEME_KEYWORDS)
+        self.source_key = None
+        self.checked_at = None
+
+    def refresh(self, container=None, force_id=None):
+        interval = float(os.environ.get('THEME_TAXONOMY_REFRESH_SECONDS', '300'))
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < interval:
+            return self.matcher
+        self.checked_at = now
+        try:
+            source_key, taxonomy = self._load(container, force_id)
+        except Exception as e:
+            logging.warning(f"Could not load theme taxonomy, keeping the current one: {e}")
+            return self.matcher
+        if source_key != self.source_key:
+            self.matcher = ThemeMatcher(taxonomy)
+            self.source_key = source_key
+            logging.info(f"Theme taxonomy loaded from {source_key[0]}: {len(self.matcher.themes)} themes (version {self.matcher.version}).")
+        return self.matcher
+
+    def _load(self, container, force_id):
+        """(source key, taxonomy) from the first configured source."""
+        if container is not None:
+            document_id = os.environ.get('THEME_TAXONOMY_DOCUMENT_ID', TAXONOMY_DOCUMENT_ID)
+            try:
+                doc = container.read_item(item=document_id, partition_key=force_id)
+                return ('document', doc.get('_etag')), doc
+            except exceptions.CosmosResourceNotFoundError:
+                pass
+        setting = os.environ.get('THEME_TAXONOMY')
+        if setting:
+            return ('setting', setting), json.loads(setting)
+        return ('default', None), DEFAULT_THEME_KEYWORDS
+
+
+_source = _TaxonomySource()
+
+
+def get_theme_matcher():
+    """The current theme matcher (defaults until a taxonomy has been loaded)."""
+    return _source.matcher
+
+
+def refresh_theme_taxonomy(container=None, force_id=None):
+    """
+    Reload the theme taxonomy if its source changed and return the current
+    matcher. The taxonomy is read from the THEME_TAXONOMY_DOCUMENT_ID document
+    (default "theme-taxonomy") in container, partition force_id, else from the
+    THEME_TAXONOMY setting (JSON), else the built-in keywords.
+    """
+    return _source.refresh(container, force_id)
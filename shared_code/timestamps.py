@@ -0,0 +1,109 @@
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+# Key under which document_epoch() memoizes the parsed timestamp on a document
+EPOCH_KEY = '_parsedEpoch'
+
+_SECONDS_PER_HOUR = 3600
+_SECONDS_PER_DAY = 86400
+_UNIX_EPOCH = datetime(1970, 1, 1)
+# Fractional seconds longer than datetime supports (e.g. .NET's 7 digits)
+_LONG_FRACTION = re.compile(r'(\.\d{6})\d+')
+
+
+def parse_datetime(ts):
+    """
+    Parse an ISO-8601 timestamp, or None if it cannot be parsed. A trailing 'Z'
+    and fractional seconds beyond microseconds are accepted.
+    """
+    if not ts or not isinstance(ts, str):
+        return None
+    if ts.endswith('Z') or ts.endswith('z'):
+        ts = ts[:-1] + '+00:00'
+    try:
+        return datetime.fromisoformat(ts)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(_LONG_FRACTION.sub(r'\1', ts))
+        except ValueError:
+            return None
+
+
+def parse_epoch(ts):
+    """
+    Seconds since the epoch for an ISO-8601 timestamp, or None. Naive values
+    are taken as UTC and offset-aware values are converted to UTC.
+    """
+    dt = parse_datetime(ts)
+    if dt is None:
+        return None
+    return to_epoch(dt)
+
+
+def document_epoch(item):
+    """
+    Epoch of a document's createdAt (falling back to timestamp), parsed once
+    and memoized on the document so later passes reuse it.
+    """
+    try:
+        return item[EPOCH_KEY]
+    except KeyError:
+        epoch = parse_epoch(item.get('createdAt') or item.get('timestamp'))
+        item[EPOCH_KEY] = epoch
+        return epoch
+
+
+def to_epoch(dt):
+    """Epoch for a datetime; naive values (as used for query windows) are UTC."""
+    if dt.tzinfo is None:
+        return (dt - _UNIX_EPOCH).total_seconds()
+    return dt.timestamp()
+
+
+def to_naive_utc(dt):
+    """A datetime converted to UTC with the tzinfo dropped; naive values pass through."""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_naive_utc(ts):
+    """Parse a request date parameter into a naive UTC datetime (ValueError if invalid)."""
+    dt = parse_datetime(ts)
+    if dt is None:
+        raise ValueError(f"Invalid isoformat string: {ts!r}")
+    return to_naive_utc(dt)
+
+
+def utc_datetime(epoch):
+    """Naive UTC datetime for an epoch."""
+    return _UNIX_EPOCH + timedelta(seconds=epoch)
+
+
+def hour_of(epoch):
+    """UTC hour of day (0-23) for an epoch."""
+    return int(epoch // _SECONDS_PER_HOUR) % 24
+
+
+def day_of(epoch):
+    """UTC calendar day ('YYYY-MM-DD') for an epoch."""
+    return utc_datetime(epoch - epoch % _SECONDS_PER_DAY).strftime('%Y-%m-%d')
+
+
+def bucket_by_hour(epochs):
+    """24-slot histogram of UTC hour of day; None entries are skipped."""
+    hourly = [0] * 24
+    for epoch in epochs:
+        if epoch is not None:
+            hourly[int(epoch // _SECONDS_PER_HOUR) % 24] += 1
+    return hourly
+
+
+def bucket_by_day(epochs):
+    """Counts per UTC day ('YYYY-MM-DD'); each distinct day is formatted once."""
+    by_day_number = Counter(int(epoch // _SECONDS_PER_DAY) for epoch in epochs if epoch is not None)
+    return {
+        day_of(day_number * _SECONDS_PER_DAY): count
+        for day_number, count in sorted(by_day_number.items())
+    }
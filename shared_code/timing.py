@@ -0,0 +1,119 @@
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from azure.core.paging import ItemPaged
+
+_TOKEN_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class Timings:
+    """
+    Stage durations, counters and Cosmos DB request charges for one
+    invocation. Reported as a Server-Timing response header and as a single
+    structured log record ("timings {...}") that App Insights can chart.
+
+    Stages may nest (e.g. "citations" inside "aggregate") and may be fed from
+    worker threads; durations of a stage entered several times add up.
+    """
+
+    def __init__(self, function_name, clock=time.perf_counter):
+        self.function_name = function_name
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self.durations = {}  # stage -> seconds, in first-seen order
+        self.counts = {}
+        self.request_charge = 0.0
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = self._clock()
+        try:
+            yield self
+        finally:
+            self.add(name, self._clock() - started)
+
+    def timed(self, stage, iterable):
+        """
+        Iterate over iterable (e.g. a Cosmos DB pager), charging only the time
+        spent producing items to stage, not the time the caller spends on them.
+        """
+        clock = self._clock
+        iterator = iter(iterable)
+        spent = 0.0
+        try:
+            while True:
+                started = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    spent += clock() - started
+                    return
+                spent += clock() - started
+                yield item
+        finally:
+            self.add(stage, spent)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def charge(self, headers, result=None):
+        """
+        Cosmos DB response_hook: adds the request charge of each response.
+        query_items also calls its hook once up front with the headers of the
+        client's previous response; that call is ignored.
+
+        The SDK hands the hook the client-wide last_response_headers, which
+        another request on the same (shared) client can replace before the
+        hook reads them. With concurrent requests on a worker the total is
+        therefore approximate: a page's charge may be counted under another
+        invocation. Use it for trends, not for billing.
+        """
+        if isinstance(result, ItemPaged) or not headers:
+            return
+        try:
+            request_charge = float(headers.get('x-ms-request-charge', 0) or 0)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self.request_charge += request_charge
+
+    def total(self):
+        return self._clock() - self._started
+
+    def server_timing(self):
+        """Server-Timing header value: one metric per stage, then total, RU and counters."""
+        metrics = [f"{_TOKEN_UNSAFE.sub('_', stage)};dur={seconds * 1000:.1f}"
+                   for stage, seconds in self.durations.items()]
+        metrics.append(f"total;dur={self.total() * 1000:.1f}")
+        if self.request_charge:
+            metrics.append(f'ru;desc="{self.request_charge:.2f}"')
+        metrics.extend(f'{_TOKEN_UNSAFE.sub("_", name)};desc="{value}"' for name, value in self.counts.items())
+        return ', '.join(metrics)
+
+    def record(self):
+        return {
+            'function': self.function_name,
+            'totalMs': round(self.total() * 1000, 1),
+            'stagesMs': {stage: round(seconds * 1000, 1) for stage, seconds in self.durations.items()},
+            'counts': dict(self.counts),
+            'requestCharge': round(self.request_charge, 2),
+        }
+
+    def log(self):
+        """Emit the structured record for this invocation."""
+        logging.info('timings ' + json.dumps(self.record()))
+
+    def finish(self, response):
+        """Add the Server-Timing header to response, log the record and return the response."""
+        response.headers['Server-Timing'] = self.server_timing()
+        self.log()
+        return response
@@ -0,0 +1,76 @@
+import logging
+import os
+
+from shared_code import partition_routing as routing
+from shared_code.response_cache import TTLCache
+
+# Lower-cased copy of a conversation's title, kept beside it so the viewers
+# can find a conversation with an indexed equality filter instead of
+# evaluating LOWER(c.title) on every document.
+TITLE_FIELD = 'titleLower'
+
+# Conversations that still need the field (or whose title changed)
+BACKFILL_QUERY = (
+    "SELECT * FROM c WHERE IS_STRING(c.title) AND c.title != '' AND "
+    f"(NOT IS_DEFINED(c.{TITLE_FIELD}) OR c.{TITLE_FIELD} != LOWER(c.title))"
+)
+
+# (container link, normalized title) -> (conversation id, partition key value)
+_recent_titles = TTLCache(4096)
+_RECENT_TITLE_TTL = 60 * 60
+
+
+def normalize_title(title):
+    """The lookup key for a title: case-insensitive, as LOWER() in Cosmos."""
+    return (title or '').lower()
+
+
+def needs_title_index(doc):
+    """True for titled documents whose titleLower is missing or stale."""
+    title = doc.get('title')
+    if not isinstance(title, str) or not title:
+        return False
+    return doc.get(TITLE_FIELD) != normalize_title(title)
+
+
+def title_fallback_enabled():
+    """Whether a titleLower miss is retried with LOWER(c.title) (TITLE_INDEX_FALLBACK, default true)."""
+    return os.environ.get('TITLE_INDEX_FALLBACK', 'true').lower() != 'false'
+
+
+def _first(container, query_text, key):
+    items = routing.query(container, query_text, [{"name": "@title", "value": key}])
+    return items[0] if items else None
+
+
+def find_conversation_by_title(container, title):
+    """
+    The conversation whose title matches case-insensitively, or None.
+    Recently opened titles are point reads; others use an equality filter on
+    titleLower. Until BackfillTitleIndex has covered the container, a miss
+    falls back to a LOWER(c.title) scan for documents the change feed or
+    backfill has not reached yet; set TITLE_INDEX_FALLBACK=false once it has,
+    so unknown titles cost one indexed query only.
+    """
+    key = normalize_title(title)
+    link = getattr(container, 'container_link', None) or id(container)
+    cached = _recent_titles.get((link, key))
+    if cached is not None:
+        conversation_id, partition = cached
+        conv = routing.point_read(container, conversation_id, partition)
+        if conv is not None and normalize_title(conv.get('title')) == key:
+            return conv
+        _recent_titles.pop((link, key))
+
+    conv = _first(container, f"SELECT * FROM c WHERE c.{TITLE_FIELD} = @title", key)
+    if conv is None and title_fallback_enabled():
+        conv = _first(container, "SELECT * FROM c WHERE LOWER(c.title) = @title", key)
+        if conv is not None:
+            logging.info(f"Conversation {conv.get('id')} has no {TITLE_FIELD} yet; run BackfillTitleIndex.")
+    if conv is None:
+        return None
+
+    partition = routing.partition_value(container, conv)
+    if partition is not None and conv.get('id'):
+        _recent_titles.set((link, key), (conv['id'], partition), ttl=_RECENT_TITLE_TTL)
+    return conv
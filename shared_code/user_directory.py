@@ -0,0 +1,164 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from azure.cosmos import PartitionKey
+
+from shared_code.graph_users import lookup_users, unknown_user
+from shared_code.response_cache import TTLCache
+
+# How long a looked-up user is served from the directory before Graph is asked again
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+# Users Graph does not know are remembered for much less, in case they are provisioned later
+DEFAULT_NEGATIVE_TTL_SECONDS = 60 * 60
+# Upper bound on how long a worker keeps an entry without re-reading the directory
+PROCESS_TTL_SECONDS = 60 * 60
+# IDs per ARRAY_CONTAINS query when reading the directory
+READ_CHUNK = 250
+_WRITERS = 8
+
+_users = TTLCache(20000)  # user ID -> details, or None for users Graph does not know
+_directory_containers = {}  # (database proxy, container name) -> ContainerProxy
+
+
+def get_user_directory_container(db):
+    """
+    Container holding one document per looked-up user, partitioned by id.
+    Cosmos DB expires the documents through their per-item ttl. It is created
+    if missing on first use; the proxy is then cached for the (pooled)
+    database proxy.
+    """
+    container_name = os.environ.get('COSMOS_DB_USER_DIRECTORY_CONTAINER', 'userDirectory')
+    container = _directory_containers.get((db, container_name))
+    if container is None:
+        container = db.create_container_if_not_exists(
+            id=container_name,
+            partition_key=PartitionKey(path='/id'),
+            default_ttl=-1
+        )
+        _directory_containers[(db, container_name)] = container
+    return container
+
+
+def _ttl_settings():
+    return (int(os.environ.get('USER_DIRECTORY_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+            int(os.environ.get('USER_DIRECTORY_NEGATIVE_TTL_SECONDS', DEFAULT_NEGATIVE_TTL_SECONDS)))
+
+
+def _remaining_ttl(doc, now):
+    """Seconds until a directory document expires (Cosmos DB deletes it shortly after)."""
+    try:
+        return doc['_ts'] + doc['ttl'] - now
+    except (KeyError, TypeError):
+        return 0
+
+
+def _read_directory(container, user_ids):
+    """Unexpired directory documents for user_ids, as user ID -> document."""
+    found = {}
+    for i in range(0, len(user_ids), READ_CHUNK):
+        chunk = user_ids[i:i + READ_CHUNK]
+        docs = container.query_items(
+            query="SELECT c.id, c.found, c.user, c.ttl, c._ts FROM c WHERE ARRAY_CONTAINS(@ids, c.id)",
+            parameters=[{"name": "@ids", "value": chunk}],
+            enable_cross_partition_query=True
+        )
+        for doc in docs:
+            found[doc['id']] = doc
+    return found
+
+
+def _write_directory(container, looked_up):
+    """Store Graph results; each document expires after the positive or negative TTL."""
+    ttl, negative_ttl = _ttl_settings()
+    cached_at = datetime.utcnow().isoformat()
+    docs = [{
+        'id': user_id,
+        'found': user is not None,
+        'user': user,
+        'cachedAt': cached_at,
+        'ttl': ttl if user is not None else negative_ttl
+    } for user_id, user in looked_up.items()]
+
+    def write(doc):
+        try:
+            container.upsert_item(body=doc)
+            return True
+        except Exception as e:
+            logging.warning(f"Could not store user {doc['id']} in the user directory: {str(e)}")
+            return False
+
+    if len(docs) <= 1:
+        return sum(write(doc) for doc in docs)
+    with ThreadPoolExecutor(max_workers=min(_WRITERS, len(docs)), thread_name_prefix='user-directory') as pool:
+        return sum(pool.map(write, docs))
+
+
+def resolve_users(user_ids, access_token, container, refresh=False):
+    """
+    Details for user_ids from, in order, this worker's cache, the shared
+    directory container and Microsoft Graph (only for users found in neither,
+    or all of them with refresh). Graph results are written back to both.
+    With container None (directory unavailable) only this worker's cache
+    and Graph are used.
+
+    Returns (user ID -> details or None, counts). Users Graph does not know
+    map to None; users that could not be resolved (no access_token, or Graph
+    failed) are left out and not cached.
+    """
+    unique_ids = list(dict.fromkeys(user_id for user_id in user_ids or () if user_id))
+    counts = {'users': len(unique_ids), 'memory': 0, 'directory': 0, 'graph': 0, 'stored': 0, 'unresolved': 0}
+    resolved = {}
+
+    missing = []
+    for user_id in unique_ids:
+        cached = _users.get(user_id, missing) if not refresh else missing
+        if cached is missing:
+            missing.append(user_id)
+        else:
+            resolved[user_id] = cached
+    counts['memory'] = len(resolved)
+
+    if missing and not refresh and container is not None:
+        now = time.time()
+        try:
+            stored = _read_directory(container, missing)
+        except Exception as e:
+            logging.warning(f"User directory read failed: {str(e)}. Falling back to Microsoft Graph.")
+            stored = {}
+        for user_id, doc in stored.items():
+            remaining = _remaining_ttl(doc, now)
+            if remaining <= 0:
+                continue
+            user = doc.get('user') if doc.get('found') else None
+            resolved[user_id] = user
+            _users.set(user_id, user, min(remaining, PROCESS_TTL_SECONDS))
+            counts['directory'] += 1
+        missing = [user_id for user_id in missing if user_id not in resolved]
+
+    if missing and access_token:
+        looked_up = lookup_users(missing, access_token)
+        ttl, negative_ttl = _ttl_settings()
+        for user_id, user in looked_up.items():
+            resolved[user_id] = user
+            _users.set(user_id, user, min(ttl if user is not None else negative_ttl, PROCESS_TTL_SECONDS))
+        counts['graph'] = len(looked_up)
+        if container is not None:
+            counts['stored'] = _write_directory(container, looked_up)
+        missing = [user_id for user_id in missing if user_id not in looked_up]
+
+    counts['unresolved'] = len(missing)
+    return resolved, counts
+
+
+def get_user_details(user_ids, access_token, container):
+    """
+    Fetch user details for a list of user IDs through the directory cache.
+    Returns a dictionary mapping user ID to user details; users that are not
+    known or could not be looked up map to 'Unknown'. container may be None
+    to look users up in Graph without the directory.
+    """
+    resolved, counts = resolve_users(user_ids, access_token, container)
+    logging.info(f"User directory: {counts}")
+    return {user_id: resolved.get(user_id) or unknown_user() for user_id in dict.fromkeys(user_ids) if user_id}
@@ -0,0 +1,193 @@
+import json
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+from azure.cosmos import exceptions
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_cosmos import FakeContainer
+from shared_code import change_feed
+from shared_code.change_feed import InMemoryChangeFeed, apply_changes, mark_days_changed
+from shared_code.enrichment import enrich_documents, is_enrichment_write
+from shared_code.rollups import read_daily_rollup, rollup_id, stale_rollup_days, write_daily_rollup
+from shared_code.theme_taxonomy import get_theme_matcher
+from shared_code.title_index import TITLE_FIELD
+
+FORCE = 'test-force'
+DAY = date(2025, 3, 4)
+
+
+def message(doc_id, day=4, role='user', **fields):
+    return dict({'id': doc_id, 'type': 'message', 'role': role, 'conversationId': 'conv-1', 'userId': 'user-1',
+                 'createdAt': f'2025-03-{day:02d}T10:15:00Z', 'content': 'hello'}, **fields)
+
+
+def tool_message(doc_id, titles, day=4):
+    content = json.dumps({'citations': [{'title': title, 'url': ''} for title in titles]})
+    return message(doc_id, day, role='tool', content=content)
+
+
+def rollup_container():
+    return FakeContainer('dailyRollups', partition_key_path='/forceId')
+
+
+def stored_rollup(generated_at):
+    return {
+        'id': rollup_id(FORCE, DAY), 'forceId': FORCE, 'type': 'daily_rollup', 'date': DAY.isoformat(),
+        'version': 1, 'taxonomyVersion': get_theme_matcher().version, 'generatedAt': generated_at, 'metrics': {}
+    }
+
+
+def marker(rollups, day=DAY):
+    return rollups.read_item(rollup_id(FORCE, day), FORCE).get('lastChangeAt')
+
+
+def test_changes_mark_each_touched_day():
+    rollups = rollup_container()
+    days = apply_changes([message('m1', day=4), message('m2', day=5), {'id': 'undated'}], 'questions', rollups, FORCE)
+
+    assert days == {date(2025, 3, 4), date(2025, 3, 5)}
+    assert marker(rollups, date(2025, 3, 4)) and marker(rollups, date(2025, 3, 5))
+    # Days without a rollup get a stub that is never served
+    assert read_daily_rollup(rollups, FORCE, DAY) is None
+    assert stale_rollup_days(rollups, FORCE, date(2025, 3, 10)) == [date(2025, 3, 5), date(2025, 3, 4)]
+
+
+def test_changes_mark_a_current_rollup_stale():
+    rollups = rollup_container()
+    write_daily_rollup(rollups, stored_rollup('2025-03-05T00:15:00'))
+    assert read_daily_rollup(rollups, FORCE, DAY) is not None
+    assert stale_rollup_days(rollups, FORCE, date(2025, 3, 10)) == []
+
+    apply_changes([message('late-click', type='citation_click')], 'history', rollups, FORCE)
+
+    assert read_daily_rollup(rollups, FORCE, DAY) is None
+    assert stale_rollup_days(rollups, FORCE, date(2025, 3, 10)) == [DAY]
+
+
+def test_replayed_batches_only_move_the_marker_forward():
+    rollups = rollup_container()
+    feed = InMemoryChangeFeed()
+    feed.upsert(message('m1'))
+    feed.upsert(message('m2'))
+    feed.run(lambda docs: apply_changes(docs, 'questions', rollups, FORCE))
+    first = marker(rollups)
+
+    # Lost checkpoint: the batch is delivered again, with an older timestamp than the marker
+    feed.leases.clear()
+    feed.run(lambda docs: mark_days_changed(rollups, FORCE, {DAY}, changed_at='2000-01-01T00:00:00'))
+    assert marker(rollups) == first
+
+    feed.leases.clear()
+    feed.run(lambda docs: apply_changes(docs, 'questions', rollups, FORCE))
+    assert marker(rollups) >= first
+
+
+def test_rebuilt_rollup_keeps_the_change_marker():
+    rollups = rollup_container()
+    apply_changes([message('m1')], 'questions', rollups, FORCE)
+    marked = marker(rollups)
+
+    write_daily_rollup(rollups, stored_rollup('2000-01-01T00:00:00'))
+    assert marker(rollups) == marked
+    # Generated before the change it missed, so still stale
+    assert read_daily_rollup(rollups, FORCE, DAY) is None
+
+    write_daily_rollup(rollups, stored_rollup('2999-01-01T00:00:00'))
+    assert read_daily_rollup(rollups, FORCE, DAY) is not None
+
+
+class InterferingContainer(FakeContainer):
+    """Runs `interfere` just before the first replace, as a concurrent rollup rebuild would."""
+
+    def __init__(self, interfere):
+        super().__init__('dailyRollups', partition_key_path='/forceId')
+        self.interfere = interfere
+        self.conflicts = 0
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        if self.interfere is not None:
+            interfere, self.interfere = self.interfere, None
+            interfere(self)
+        try:
+            return super().replace_item(item, body, etag=etag, match_condition=match_condition, **kwargs)
+        except exceptions.CosmosAccessConditionFailedError:
+            self.conflicts += 1
+            raise
+
+
+def test_etag_conflict_is_retried_without_losing_either_write():
+    rollups = InterferingContainer(lambda container: container.upsert_item(
+        dict(stored_rollup('2025-03-05T00:15:00'), metrics={'totalInteractions': 7})))
+    FakeContainer.upsert_item(rollups, stored_rollup('2025-03-05T00:15:00'))
+
+    apply_changes([message('m1')], 'questions', rollups, FORCE)
+
+    assert rollups.conflicts == 1
+    doc = rollups.read_item(rollup_id(FORCE, DAY), FORCE)
+    assert doc['metrics'] == {'totalInteractions': 7}
+    assert doc['lastChangeAt'] > doc['generatedAt']
+
+
+def test_conflicts_beyond_the_retry_budget_raise(monkeypatch):
+    class AlwaysConflicting(FakeContainer):
+        def create_item(self, body, **kwargs):
+            raise exceptions.CosmosResourceExistsError(message='exists')
+
+    monkeypatch.setattr(change_feed, 'MAX_WRITE_ATTEMPTS', 3)
+    with pytest.raises(Exception, match='after 3 attempts'):
+        apply_changes([message('m1')], 'questions', AlwaysConflicting('dailyRollups', partition_key_path='/forceId'),
+                      FORCE)
+
+
+def test_enrichment_writes_do_not_mark_the_day_again():
+    rollups = rollup_container()
+    questions = FakeContainer('questions', partition_key_path='/userId')
+    feed = InMemoryChangeFeed()
+
+    class FeedingContainer:
+        """The questions container, with every write coming back through the change feed."""
+
+        def replace_item(self, item, body, **kwargs):
+            written = questions.replace_item(item, body, **kwargs)
+            feed.upsert(written)
+            return written
+
+    markers = []
+
+    def handler(docs):
+        changed = [doc for doc in docs if not is_enrichment_write(doc)]
+        if changed:
+            apply_changes(changed, 'questions', rollups, FORCE)
+        enrich_documents(FeedingContainer(), docs)
+        markers.append(marker(rollups))
+
+    for doc in (tool_message('t1', ['Custody procedures']), message('m1')):
+        feed.upsert(questions.upsert_item(doc))
+
+    # The original batch, then the enriched tool message coming back
+    assert feed.run(handler) == 2
+    assert questions.read_item('t1', 'user-1')['citationSummary']['count'] == 1
+    assert markers[0] == markers[1]
+
+    # A rollup rebuilt since stays current; a genuine edit still marks the day
+    write_daily_rollup(rollups, stored_rollup(datetime.utcnow().isoformat()))
+    assert read_daily_rollup(rollups, FORCE, DAY) is not None
+    feed.upsert(questions.upsert_item(dict(questions.read_item('t1', 'user-1'), role='assistant')))
+    feed.run(handler)
+    assert markers[-1] > markers[0]
+    assert read_daily_rollup(rollups, FORCE, DAY) is None
+
+
+def test_history_enrichment_only_stores_title_lower():
+    history = FakeContainer('Conversations', partition_key_path='/userId')
+    conversation = history.upsert_item({'id': 'c1', 'type': 'conversation', 'userId': 'user-1', 'title': 'Bail Checks'})
+    tool = history.upsert_item(tool_message('t1', ['Custody procedures']))
+
+    assert enrich_documents(history, [conversation, tool], names=(TITLE_FIELD,)) == 1
+    assert history.read_item('c1', 'user-1')['titleLower'] == 'bail checks'
+    assert 'citationSummary' not in history.read_item('t1', 'user-1')
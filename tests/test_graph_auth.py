@@ -0,0 +1,121 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared_code import graph_auth
+from shared_code.graph_auth import GraphTokenProvider, get_token_provider
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeMsalApp:
+    """Stands in for msal.ConfidentialClientApplication; hands out numbered tokens."""
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.failures = []  # results returned (once each) before succeeding again
+        self.calls = 0
+        self.created = 0
+
+    def factory(self, client_id, authority, client_secret):
+        self.created += 1
+        return self
+
+    def acquire_token_for_client(self, scopes):
+        self.calls += 1
+        if self.failures:
+            return self.failures.pop(0)
+        return {'access_token': f'token-{self.calls}', 'expires_in': self.expires_in}
+
+
+def provider(app, clock):
+    return GraphTokenProvider('client', 'tenant', 'secret', app_factory=app.factory, clock=clock)
+
+
+def test_token_is_reused_within_its_lifetime():
+    app, clock = FakeMsalApp(), FakeClock()
+    tokens = provider(app, clock)
+
+    first = tokens.get_token()
+    clock.advance(3600 - 301)
+    assert tokens.get_token() == first
+    assert app.calls == 1
+    assert app.created == 1
+
+
+def test_token_is_refreshed_inside_the_refresh_margin():
+    app, clock = FakeMsalApp(), FakeClock()
+    tokens = provider(app, clock)
+
+    assert tokens.get_token() == 'token-1'
+    clock.advance(3600 - 299)
+    assert tokens.get_token() == 'token-2'
+    assert tokens.acquisitions == 2
+    # The MSAL application (and its cache) is kept across refreshes
+    assert app.created == 1
+
+
+def test_failures_are_not_cached():
+    app, clock = FakeMsalApp(), FakeClock()
+    app.failures = [{'error': 'invalid_client', 'error_description': 'AADSTS7000215'}]
+    tokens = provider(app, clock)
+
+    result = tokens.acquire_token()
+    assert 'access_token' not in result
+    assert result['error'] == 'invalid_client'
+    assert tokens.get_token() == 'token-2'
+    assert app.calls == 2
+
+
+def test_invalidate_after_401_forces_a_new_token():
+    app, clock = FakeMsalApp(), FakeClock()
+    tokens = provider(app, clock)
+
+    assert tokens.get_token() == 'token-1'
+    tokens.invalidate()
+    assert tokens.get_token() == 'token-2'
+    assert tokens.get_token() == 'token-2'
+    assert app.calls == 2
+
+
+def test_mail_and_user_lookup_paths_share_one_provider(monkeypatch):
+    monkeypatch.setattr(graph_auth, '_providers', {})
+    monkeypatch.setenv('GRAPH_CLIENT_ID', 'client')
+    monkeypatch.setenv('GRAPH_TENANT_ID', 'tenant')
+    monkeypatch.setenv('GRAPH_CLIENT_SECRET', 'secret')
+    app = FakeMsalApp()
+
+    # TimerTrigger passes the credentials it read; ExportToCSV and WarmUserDirectory use the defaults
+    mail = get_token_provider('client', 'tenant', 'secret', app_factory=app.factory)
+    lookup = get_token_provider()
+    assert mail is lookup
+
+    assert mail.acquire_token()['access_token'] == 'token-1'
+    assert lookup.get_token() == 'token-1'
+    assert app.calls == 1
+
+    # sendMail rejected the token: the lookup path picks up the replacement too
+    mail.invalidate()
+    assert lookup.get_token() == 'token-2'
+    assert app.created == 1
+
+
+@pytest.mark.parametrize('missing', ['GRAPH_CLIENT_ID', 'GRAPH_TENANT_ID', 'GRAPH_CLIENT_SECRET'])
+def test_no_provider_without_credentials(monkeypatch, missing):
+    monkeypatch.setattr(graph_auth, '_providers', {})
+    for name in ('GRAPH_CLIENT_ID', 'GRAPH_TENANT_ID', 'GRAPH_CLIENT_SECRET'):
+        monkeypatch.setenv(name, 'value')
+    monkeypatch.delenv(missing)
+    assert get_token_provider() is None
@@ -0,0 +1,58 @@
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_cosmos import FakeContainer
+from shared_code.analytics_aggregation import merge_states
+from shared_code.rollups import (build_daily_rollup, load_window_states, read_daily_rollup, rollup_id,
+                                 write_daily_rollup)
+
+FORCE = 'test-force'
+TODAY = date(2025, 1, 10)
+
+
+def documents():
+    docs = []
+    for day in (7, 8, 9):
+        for i in range(5):
+            conv_id = f'conv-{day}-{i}'
+            docs.append({'id': conv_id, 'type': 'conversation', 'userId': f'user-{i}', 'title': f'Bail query {i}',
+                         'createdAt': f'2025-01-{day:02d}T10:0{i}:00'})
+            docs.append({'id': f'{conv_id}-m', 'type': 'message', 'role': 'user', 'conversationId': conv_id,
+                         'userId': f'user-{i}', 'content': 'hello', 'createdAt': f'2025-01-{day:02d}T10:0{i}:30'})
+    return docs
+
+
+def containers():
+    return (FakeContainer('questions', documents(), partition_key_path='/userId'),
+            FakeContainer('dailyRollups', partition_key_path='/forceId'))
+
+
+def test_oversized_rollup_is_stored_without_metrics_and_scanned_live(monkeypatch):
+    container, rollups = containers()
+    monkeypatch.setenv('ROLLUP_MAX_BYTES', '500')
+    start, end = datetime(2025, 1, 7), datetime(2025, 1, 9, 23, 59, 59)
+
+    first = merge_states(load_window_states(container, None, rollups, FORCE, start, end, today=TODAY))
+    stub = read_daily_rollup(rollups, FORCE, date(2025, 1, 8))
+    assert stub['oversized'] and 'metrics' not in stub
+
+    # The stubs are current: the next request scans the days live instead of rebuilding them
+    container.reset_stats()
+    second = merge_states(load_window_states(container, None, rollups, FORCE, start, end, today=TODAY))
+    assert container.stats['queries'] == 1
+    assert second['totalInteractions'] == first['totalInteractions'] == 30
+    assert len(second['users']) == 5
+
+
+def test_rollups_within_the_limit_keep_their_metrics():
+    container, rollups = containers()
+    doc = build_daily_rollup(container, None, FORCE, date(2025, 1, 8))
+    write_daily_rollup(rollups, doc)
+
+    stored = rollups.read_item(rollup_id(FORCE, date(2025, 1, 8)), FORCE)
+    assert not stored.get('oversized')
+    assert stored['metrics']['totalInteractions'] == 10
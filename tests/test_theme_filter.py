@@ -0,0 +1,65 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_cosmos import FakeContainer
+from shared_code import theme_taxonomy
+from shared_code.analytics_queries import build_analytics_query
+from shared_code.theme_taxonomy import ThemeMatcher
+
+TAXONOMY = [{"theme": "domestic abuse", "keywords": ["domestic abuse", "dv"], "wordBoundary": True}, "bail"]
+TITLES = ['DV incident at home', 'Domestic abuse referral', 'Advised caller on bail', 'Bail conditions', 'Noise']
+
+
+def conversation(i, title, **fields):
+    return dict({'id': f'c{i}', 'type': 'conversation', 'category': 'conversation', 'userId': 'u1',
+                 'title': title, 'createdAt': '2025-01-10T09:00:00'}, **fields)
+
+
+@pytest.fixture
+def matcher(monkeypatch):
+    matcher = ThemeMatcher(TAXONOMY)
+    monkeypatch.setattr(theme_taxonomy._source, 'matcher', matcher)
+    return matcher
+
+
+def test_filter_follows_keywords_and_word_boundaries(matcher):
+    items = [conversation(i, title) for i, title in enumerate(TITLES)]
+    selected = [item['title'] for item in items if matcher.has_theme(item, 'Domestic Abuse')]
+
+    # "DV" is one of the theme's keywords; "advised" contains "dv" but not as a word
+    assert selected == ['DV incident at home', 'Domestic abuse referral']
+    assert matcher.has_theme(conversation(9, 'Advice', themes=['domestic abuse']), 'domestic abuse')
+
+
+def test_labels_outside_the_taxonomy_match_as_substring(matcher):
+    assert matcher.keywords('referral') is None
+    assert matcher.has_theme(conversation(1, 'Domestic abuse referral'), 'referral')
+    assert not matcher.has_theme(conversation(2, 'Bail conditions'), 'referral')
+
+
+def test_query_pushes_down_the_theme_keywords(matcher):
+    query, parameters = build_analytics_query(theme='domestic abuse', theme_keywords=matcher.keywords('domestic abuse'))
+    values = {param['name']: param['value'] for param in parameters}
+
+    assert 'CONTAINS(c.title, @themeKeyword0, true) OR CONTAINS(c.title, @themeKeyword1, true)' in query
+    assert values['@themeKeyword1'] == 'dv'
+    assert values['@theme'] == 'domestic abuse'
+
+
+def test_filtered_count_matches_the_theme_breakdown(matcher):
+    import GetAnalytics
+
+    container = FakeContainer('questions', [conversation(i, title) for i, title in enumerate(TITLES)],
+                              partition_key_path='/userId')
+    start, end = datetime(2025, 1, 1), datetime(2025, 1, 31, 23, 59, 59)
+    overall = GetAnalytics.live_state(container, None, start, end, None, None)
+    filtered = GetAnalytics.live_state(container, None, start, end, 'domestic abuse', None)
+
+    assert overall['themes']['domestic abuse'] == 2
+    assert filtered['totalInteractions'] == overall['themes']['domestic abuse']
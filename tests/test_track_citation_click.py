@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import azure.functions as func
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import TrackCitationClick
+from shared_code.cosmos_pool import HISTORY_CONTAINER, HISTORY_DATABASE
+
+
+class RecordingContainer:
+    def __init__(self):
+        self.items = []
+
+    def create_item(self, body):
+        self.items.append(body)
+        return body
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    monkeypatch.delenv('COSMOS_DB_DATABASE', raising=False)
+    monkeypatch.delenv('COSMOS_DB_CONTAINER', raising=False)
+    opened = {}
+
+    def get_container(container_name, database_name):
+        return opened.setdefault((database_name, container_name), RecordingContainer())
+
+    monkeypatch.setattr(TrackCitationClick, 'get_container', get_container)
+    return opened
+
+
+def click(**fields):
+    body = dict({'conversationId': 'conv-1', 'citationTitle': 'Custody procedures'}, **fields)
+    req = func.HttpRequest('POST', '/api/TrackCitationClick', body=json.dumps(body).encode('utf-8'))
+    return TrackCitationClick.main(req)
+
+
+@pytest.mark.parametrize('target', [{}, {'databaseName': 'coppa-db', 'containerName': 'questions'},
+                                    {'databaseName': HISTORY_DATABASE, 'containerName': HISTORY_CONTAINER}])
+def test_clicks_are_written_to_known_containers(opened, target):
+    assert click(**target).status_code == 200
+    [container] = opened.values()
+    assert container.items[0]['type'] == 'citation_click'
+
+
+@pytest.mark.parametrize('target', [{'containerName': 'anything'}, {'databaseName': 'other-db'},
+                                    {'databaseName': HISTORY_DATABASE, 'containerName': 'questions'}])
+def test_unknown_containers_are_rejected_before_opening_them(opened, target):
+    assert click(**target).status_code == 400
+    assert opened == {}